@@ -0,0 +1,26 @@
+"""
+gunicorn 配置 - YouTube Audio Download Server
+
+启动命令:
+gunicorn -c gunicorn.conf.py youtube_audio_proxy_server:app
+
+说明:
+- 下载任务状态、线程池和进行中的请求都保存在进程内存中，因此只使用 1 个 worker，
+  通过 gthread 线程处理并发请求（/download 与 /status 必须落在同一个进程）
+- 频道/视频信息缓存保存在 SQLite（cache/cache.db）中，重启后仍然有效
+- 线程数可通过 THREADS 环境变量调整；同时处理的下载数由 DOWNLOAD_WORKERS 单独控制
+"""
+
+import os
+
+bind = "0.0.0.0:5000"
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get('THREADS', 8))
+timeout = 120  # yt-dlp 元数据请求可能较慢
+
+
+def post_worker_init(worker):
+    """worker 加载应用后启动清理定时器（gunicorn 不会执行脚本的 __main__ 部分）"""
+    from youtube_audio_proxy_server import start_background_jobs
+    start_background_jobs()
@@ -0,0 +1,37 @@
+"""
+测试辅助：在临时目录中导入服务模块
+
+服务模块导入时会在当前目录创建 downloads/、cache/ 和日志文件，
+因此先切换到临时工作目录再导入，测试不会污染仓库目录。
+"""
+
+import importlib
+import logging
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="yt-audio-proxy-test-")
+
+
+def load_server():
+    """导入（或返回已导入的）youtube_audio_proxy_server 模块"""
+    if 'youtube_audio_proxy_server' not in sys.modules:
+        os.chdir(WORKDIR)
+        if ROOT not in sys.path:
+            sys.path.insert(0, ROOT)
+    server = importlib.import_module('youtube_audio_proxy_server')
+    server.logger.setLevel(logging.WARNING)
+    return server
+
+
+def make_task(server, video_id, status=None):
+    """构造一个最小的下载任务"""
+    return server.DownloadTask(
+        task_id=f"task-{video_id}",
+        video_id=video_id,
+        status=status or server.TaskStatus.PENDING,
+        progress=0.0,
+        message="",
+    )
@@ -0,0 +1,72 @@
+"""线程池等待超时测试"""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from support import load_server
+
+server = load_server()
+
+
+class RunInPoolTimeoutTest(unittest.TestCase):
+
+    def test_timeout_cancels_queued_job(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        self.addCleanup(pool.shutdown)
+        self.addCleanup(release.set)
+        # 占住唯一的工作线程，让下一个任务只能排队
+        pool.submit(release.wait, 5)
+        submitted = []
+        real_submit = pool.submit
+
+        def submit(func, *args):
+            future = real_submit(func, *args)
+            submitted.append(future)
+            return future
+
+        calls = []
+        with mock.patch.object(pool, 'submit', side_effect=submit):
+            with self.assertRaises(server.FuturesTimeoutError):
+                server.run_in_pool(calls.append, 'queued', pool=pool, timeout=0.05)
+
+        release.set()
+        pool.shutdown(wait=True)
+        # 超时后排队中的任务被取消，不会在线程空闲后继续执行
+        self.assertTrue(submitted[0].cancelled())
+        self.assertEqual(calls, [])
+
+
+class ApiTimeoutResponseTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(server, 'run_in_pool', side_effect=server.FuturesTimeoutError())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = server.app.test_client()
+
+    def assertTimeoutResponse(self, url):
+        with self.assertLogs(server.logger, 'WARNING'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 504)
+        self.assertIn('Timed out', response.get_json()['error'])
+        return response
+
+    def test_channel_info(self):
+        self.assertTimeoutResponse('/api/channel/info?id=UCxxxxxxxxxxxxxxxxxxxxxx')
+
+    def test_channel_videos(self):
+        response = self.assertTimeoutResponse('/api/channel/videos?id=UCxxxxxxxxxxxxxxxxxxxxxx')
+        self.assertEqual(response.get_json()['status'], 'error')
+
+    def test_video_info(self):
+        self.assertTimeoutResponse('/api/video/info?id=dQw4w9WgXcQ')
+
+    def test_channel_search(self):
+        self.assertTimeoutResponse('/api/search/channel?q=music')
+
+
+if __name__ == '__main__':
+    unittest.main()
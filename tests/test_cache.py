@@ -0,0 +1,74 @@
+"""内存缓存 / 磁盘缓存测试"""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import load_server
+
+server = load_server()
+
+
+class MemCachePromotionTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(server, '_MEM_CACHE', server.OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_disk_cache(self, key, data, age):
+        server.save_cache(key, data)
+        server.flush_cache_writes()
+        conn = server.get_cache_db()
+        with conn:
+            conn.execute('UPDATE cache SET mtime = ? WHERE key = ?', (time.time() - age, key))
+
+    def test_load_cache_returns_row_mtime(self):
+        self.write_disk_cache('test:mtime', {'a': 1}, age=100)
+        data, mtime = server.load_cache('test:mtime')
+        self.assertEqual(data, {'a': 1})
+        self.assertAlmostEqual(mtime, time.time() - 100, delta=5)
+
+    def test_load_cache_miss(self):
+        self.assertEqual(server.load_cache('test:missing'), (None, 0.0))
+
+    def test_promoted_entry_keeps_disk_age(self):
+        self.write_disk_cache('test:old', {'a': 1}, age=100)
+        data, mtime = server.load_cache('test:old')
+        server.mem_put_from_disk('test:old', data, mtime)
+        # 磁盘上已存在 100 秒，提升到内存后剩余寿命不会重新计时
+        self.assertIsNone(server.mem_get('test:old', 60))
+        server.mem_put_from_disk('test:old', data, mtime)
+        self.assertEqual(server.mem_get('test:old', 200), {'a': 1})
+
+    def test_fresh_put_uses_current_time(self):
+        server.mem_put('test:new', 'value')
+        self.assertEqual(server.mem_get('test:new', 60), 'value')
+
+
+class CacheDbConnectionTest(unittest.TestCase):
+
+    def test_database_uses_wal_mode(self):
+        mode = server.get_cache_db().execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_new_thread_connection_runs_no_setup_statements(self):
+        statements = []
+        result = []
+
+        def read_in_new_thread():
+            conn = server.get_cache_db()
+            conn.set_trace_callback(statements.append)
+            result.append(server.count_cache_entries())
+
+        thread = threading.Thread(target=read_in_new_thread)
+        thread.start()
+        thread.join(5)
+        # 请求线程只执行查询本身，建表和 PRAGMA 已在启动时完成
+        self.assertEqual(len(result), 1)
+        self.assertEqual(statements, ['SELECT COUNT(*) FROM cache'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+"""下载目录清理测试"""
+
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import load_server, make_task
+
+server = load_server()
+
+EXPIRED_AGE = server.CACHE_EXPIRE_SECONDS + 3600
+
+
+def clear_download_dir():
+    with os.scandir(server.DOWNLOAD_DIR) as it:
+        for entry in it:
+            os.unlink(entry.path)
+
+
+def make_file(name, age=0.0):
+    """在下载目录中创建文件，age 为距今的秒数（修改时间）"""
+    path = os.path.join(os.path.realpath(server.DOWNLOAD_DIR), name)
+    with open(path, 'w') as f:
+        f.write('x')
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def download_files():
+    return sorted(os.listdir(server.DOWNLOAD_DIR))
+
+
+class CleanupTestCase(unittest.TestCase):
+    """每个测试使用空的下载目录、空的任务表和重置后的扫描提示"""
+
+    def setUp(self):
+        clear_download_dir()
+        server.invalidate_cleanup_hint()
+        self.download_root = os.path.realpath(server.DOWNLOAD_DIR)
+        patches = [
+            mock.patch.object(server, 'tasks', server.TaskStore()),
+            # 默认关闭水位判断，单独的测试再打开
+            mock.patch.object(server, 'CLEANUP_DISK_HIGH_WATERMARK', 0.0),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def count_download_scans(self, func, *args, **kwargs):
+        """执行 func，返回其中扫描下载目录的次数"""
+        real_scandir = os.scandir
+        scans = []
+
+        def scandir(path='.'):
+            if os.fspath(path) == self.download_root:
+                scans.append(path)
+            return real_scandir(path)
+
+        with mock.patch.object(server.os, 'scandir', side_effect=scandir):
+            func(*args, **kwargs)
+        return len(scans)
+
+
+class CleanupScanHintTest(CleanupTestCase):
+
+    def test_removes_expired_and_keeps_fresh_files(self):
+        make_file('old.mp3', EXPIRED_AGE)
+        make_file('new.mp3')
+        server.cleanup_old_files()
+        self.assertEqual(download_files(), ['new.mp3'])
+
+    def test_protects_files_of_known_tasks(self):
+        path = make_file('in_use.mp3', EXPIRED_AGE)
+        task = make_task(server, 'in_use')
+        task.audio_file = path
+        server.tasks.put(task)
+        server.cleanup_old_files()
+        self.assertEqual(download_files(), ['in_use.mp3'])
+
+    def test_skips_scan_until_something_can_expire(self):
+        make_file('new.mp3')
+        self.assertEqual(self.count_download_scans(server.cleanup_old_files), 1)
+        self.assertEqual(self.count_download_scans(server.cleanup_old_files), 0)
+
+    def test_rescans_when_directory_changes(self):
+        make_file('new.mp3')
+        server.cleanup_old_files()
+        # 创建文件会更新目录的 mtime（等待以确保时间戳变化）
+        time.sleep(0.01)
+        make_file('another.mp3')
+        self.assertEqual(self.count_download_scans(server.cleanup_old_files), 1)
+
+    def test_rescans_when_earliest_file_expires(self):
+        make_file('new.mp3')
+        server.cleanup_old_files()
+        with mock.patch.object(server.time, 'time', return_value=time.time() + EXPIRED_AGE):
+            self.assertEqual(self.count_download_scans(server.cleanup_old_files), 1)
+
+    def test_invalidate_forces_rescan(self):
+        make_file('new.mp3')
+        server.cleanup_old_files()
+        server.invalidate_cleanup_hint()
+        self.assertEqual(self.count_download_scans(server.cleanup_old_files), 1)
+
+
+class CleanupWatermarkTest(CleanupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, value in (('CLEANUP_DISK_HIGH_WATERMARK', 0.8),
+                            ('CLEANUP_DISK_LOW_WATERMARK', 0.6),
+                            # 每删除一个文件检查一次低水位
+                            ('CLEANUP_UNLINK_WORKERS', 1)):
+            patcher = mock.patch.object(server, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def set_usage(self, func):
+        patcher = mock.patch.object(server, 'disk_usage_ratio', side_effect=func)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_expired_files(self, count):
+        # 文件名越小越旧，删除顺序应为 f0, f1, ...
+        for i in range(count):
+            make_file(f'f{i}', EXPIRED_AGE + (count - i) * 60)
+
+    def test_skips_download_dir_below_high_watermark(self):
+        self.set_usage(lambda path: 0.5)
+        self.make_expired_files(2)
+        self.assertEqual(self.count_download_scans(server.cleanup_old_files), 0)
+        self.assertEqual(download_files(), ['f0', 'f1'])
+
+    def test_deletes_oldest_until_below_low_watermark(self):
+        # 每个剩余文件占 10% 的磁盘：5 个文件时 80%，删到 2 个时降到 60% 以下
+        self.set_usage(lambda path: 0.3 + 0.1 * len(download_files()))
+        self.make_expired_files(5)
+        server.cleanup_old_files()
+        self.assertEqual(download_files(), ['f3', 'f4'])
+        # 提前停止时没有看到全部文件，下次必须重新扫描
+        self.assertEqual(server._download_scan_hint, (0, 0.0))
+
+    def test_force_ignores_watermarks(self):
+        self.set_usage(lambda path: 0.1)
+        self.make_expired_files(3)
+        make_file('new.mp3')
+        server.cleanup_old_files(force=True)
+        self.assertEqual(download_files(), ['new.mp3'])
+
+    def test_unknown_usage_cleans_everything_expired(self):
+        # 平台不支持 statvfs 时保持原来的行为
+        self.set_usage(lambda path: None)
+        self.make_expired_files(3)
+        server.cleanup_old_files()
+        self.assertEqual(download_files(), [])
+
+    def test_zero_high_watermark_disables_gating(self):
+        self.set_usage(lambda path: 0.1)
+        self.make_expired_files(3)
+        with mock.patch.object(server, 'CLEANUP_DISK_HIGH_WATERMARK', 0.0):
+            server.cleanup_old_files()
+        self.assertEqual(download_files(), [])
+
+
+class CleanupRequestTest(unittest.TestCase):
+    """request_cleanup 的排队与 force 合并"""
+
+    def test_force_request_is_not_dropped_while_cleanup_runs(self):
+        running = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fake_cleanup(force=False):
+            calls.append(force)
+            running.set()
+            release.wait(5)
+
+        with mock.patch.object(server, 'cleanup_old_files', side_effect=fake_cleanup):
+            self.assertTrue(server.request_cleanup())
+            self.assertTrue(running.wait(5))
+            # 清理进行中：强制请求排队，之后的请求合并到这一次
+            self.assertTrue(server.request_cleanup(force=True))
+            self.assertFalse(server.request_cleanup())
+            release.set()
+            server.CLEANUP_POOL.submit(lambda: None).result(5)
+
+        self.assertEqual(calls, [False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""@coalesced 并发调用合并测试"""
+
+import threading
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest import mock
+
+from support import load_server
+
+server = load_server()
+
+
+class WaiterCountingFuture(Future):
+    """记录有多少个调用正在等待结果的 Future"""
+
+    waiting = None
+
+    def result(self, timeout=None):
+        self.waiting.release()
+        return super().result(timeout)
+
+
+class CoalescedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+        @server.coalesced
+        def lookup(key):
+            self.calls.append(key)
+            self.started.set()
+            self.release.wait(5)
+            if key == 'bad':
+                raise ValueError(key)
+            return {'key': key}
+
+        self.lookup = lookup
+        self.waiting = threading.Semaphore(0)
+        patcher = mock.patch.object(server, 'Future', WaiterCountingFuture)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        WaiterCountingFuture.waiting = self.waiting
+        self.pool = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.pool.shutdown)
+        self.addCleanup(self.release.set)
+
+    def start_calls(self, key, count):
+        """先启动一个调用并等它进入函数，再发起其余并发调用"""
+        first = self.pool.submit(self.lookup, key)
+        self.assertTrue(self.started.wait(5))
+        rest = [self.pool.submit(self.lookup, key) for _ in range(count - 1)]
+        # 等待其余调用都开始等待同一个 Future
+        for _ in rest:
+            self.assertTrue(self.waiting.acquire(timeout=5))
+        return [first] + rest
+
+    def test_concurrent_identical_calls_share_one_result(self):
+        futures = self.start_calls('a', 3)
+        self.release.set()
+        results = [future.result(5) for future in futures]
+        self.assertEqual(self.calls, ['a'])
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_exception_is_shared_with_waiters(self):
+        futures = self.start_calls('bad', 2)
+        self.release.set()
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(5)
+        self.assertEqual(self.calls, ['bad'])
+
+    def test_later_call_runs_again(self):
+        self.release.set()
+        self.lookup('a')
+        self.lookup('a')
+        self.assertEqual(self.calls, ['a', 'a'])
+        self.assertEqual(server._INFLIGHT, {})
+
+    def test_different_arguments_are_not_merged(self):
+        self.release.set()
+        self.assertEqual(self.lookup('a'), {'key': 'a'})
+        self.assertEqual(self.lookup('b'), {'key': 'b'})
+        self.assertEqual(self.calls, ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""已下载文件查找测试"""
+
+import os
+import unittest
+from unittest import mock
+
+from support import load_server
+
+server = load_server()
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+class FileLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(server, 'tasks', server.TaskStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.audio_file = server.get_file_path(VIDEO_ID, 'audio')
+        self.base = os.fspath(self.audio_file.with_suffix(''))
+        self.download_root = os.path.realpath(server.DOWNLOAD_DIR)
+
+    def write(self, path, data=b'x'):
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.addCleanup(os.unlink, path)
+
+    def count_download_scans(self, func, *args):
+        """执行 func，返回 (结果, 扫描下载目录的次数)"""
+        real_scandir = os.scandir
+        scans = []
+
+        def scandir(path='.'):
+            if os.path.realpath(path) == self.download_root:
+                scans.append(path)
+            return real_scandir(path)
+
+        with mock.patch.object(server.os, 'scandir', side_effect=scandir):
+            result = func(*args)
+        return result, len(scans)
+
+    def test_expected_mp3_found_without_scan(self):
+        self.write(self.audio_file)
+        found, scans = self.count_download_scans(server.find_actual_audio_file, VIDEO_ID)
+        self.assertEqual(found, self.audio_file)
+        self.assertEqual(scans, 0)
+
+    def test_falls_back_to_scan_for_other_extensions(self):
+        self.write(self.base + '.m4a')
+        found, scans = self.count_download_scans(server.find_actual_audio_file, VIDEO_ID)
+        self.assertEqual(os.fspath(found), self.base + '.m4a')
+        self.assertEqual(scans, 1)
+
+    def test_empty_mp3_is_ignored(self):
+        self.write(self.audio_file, b'')
+        self.assertIsNone(server.find_actual_audio_file(VIDEO_ID))
+
+    def test_check_existing_files_returns_paths_without_scan(self):
+        self.write(self.audio_file)
+        self.write(server.get_file_path(VIDEO_ID, 'subtitle'))
+        result, scans = self.count_download_scans(server.check_existing_files, VIDEO_ID)
+        self.assertEqual(result['audio'], self.audio_file)
+        self.assertEqual(result['subtitle'], server.get_file_path(VIDEO_ID, 'subtitle'))
+        self.assertIsNone(result['info'])
+        self.assertEqual(scans, 0)
+
+    def test_download_of_existing_file_does_not_scan(self):
+        self.write(self.audio_file)
+        self.write(server.get_file_path(VIDEO_ID, 'info'), b'{"title": "cached"}')
+        client = server.app.test_client()
+        response, scans = self.count_download_scans(client.post, f'/download?id={VIDEO_ID}')
+        self.assertEqual(response.get_json()['status'], 'completed')
+        self.assertEqual(scans, 0)
+        task = server.tasks.get(VIDEO_ID)
+        self.assertEqual(task.audio_file, os.path.realpath(self.audio_file))
+        self.assertIsNone(task.subtitle_file)
+        self.assertEqual(task.video_info, {'title': 'cached'})
+
+
+if __name__ == '__main__':
+    unittest.main()
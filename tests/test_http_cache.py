@@ -0,0 +1,120 @@
+"""条件请求（ETag / 304）测试"""
+
+import os
+import unittest
+from unittest import mock
+
+from support import load_server, make_task
+
+server = load_server()
+TaskStatus = server.TaskStatus
+
+
+class StatusETagTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(server, 'tasks', server.TaskStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = server.app.test_client()
+        self.task = make_task(server, 'status-video')
+        server.tasks.put(self.task)
+
+    def get_status(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get('/status?id=status-video', headers=headers)
+
+    def test_first_poll_returns_body_with_weak_etag(self):
+        response = self.get_status()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'pending')
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+    def test_unchanged_poll_returns_304(self):
+        etag = self.get_status().headers['ETag']
+        response = self.get_status(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_small_progress_change_still_returns_304(self):
+        etag = self.get_status().headers['ETag']
+        # 进度按 1% 取整，同一百分比内的变化不需要重新发送
+        self.task.update(progress=0.001, message="下载中... 0.1%")
+        self.assertEqual(self.get_status(etag).status_code, 304)
+
+    def test_progress_or_status_change_returns_body(self):
+        etag = self.get_status().headers['ETag']
+        server.tasks.transition(self.task, TaskStatus.DOWNLOADING, progress=0.25)
+        response = self.get_status(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['progress'], 0.25)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+
+class FileETagTest(unittest.TestCase):
+
+    VIDEO_ID = 'dQw4w9WgXcQ'
+
+    def setUp(self):
+        patcher = mock.patch.object(server, 'tasks', server.TaskStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = server.app.test_client()
+        self.audio_file = server.get_file_path(self.VIDEO_ID, 'audio')
+        self.write_audio(b'0123456789')
+        self.addCleanup(os.unlink, self.audio_file)
+
+    def write_audio(self, data):
+        with open(self.audio_file, 'wb') as f:
+            f.write(data)
+
+    def get_audio(self, **headers):
+        return self.client.get(f'/files/audio?id={self.VIDEO_ID}', headers=headers)
+
+    def test_serves_file_with_strong_etag(self):
+        response = self.get_audio()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'0123456789')
+        self.assertFalse(response.headers['ETag'].startswith('W/'))
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        response.close()
+
+    def test_matching_etag_returns_304(self):
+        first = self.get_audio()
+        etag = first.headers['ETag']
+        first.close()
+        response = self.get_audio(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_changed_file_returns_new_body(self):
+        first = self.get_audio()
+        etag = first.headers['ETag']
+        first.close()
+        self.write_audio(b'changed content')
+        response = self.get_audio(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'changed content')
+        response.close()
+
+    def test_range_request_returns_partial_content(self):
+        response = self.get_audio(Range='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b'2345')
+        response.close()
+
+    def test_nginx_offload_returns_accel_redirect(self):
+        with mock.patch.object(server, 'STATIC_OFFLOAD', 'nginx'):
+            response = self.get_audio()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['X-Accel-Redirect'],
+                         server.ACCEL_REDIRECT_PREFIX + self.audio_file.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""DelayedScheduler 测试"""
+
+import threading
+import unittest
+
+from support import load_server
+
+server = load_server()
+
+
+class DelayedSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = server.DelayedScheduler("test-scheduler")
+
+    def test_call_later_runs_in_deadline_order(self):
+        done = threading.Event()
+        order = []
+        self.scheduler.call_later(0.05, order.append, 'late')
+        self.scheduler.call_later(0.01, order.append, 'early')
+        self.scheduler.call_later(0.08, done.set)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(order, ['early', 'late'])
+
+    def test_call_every_repeats_after_failures(self):
+        reached = threading.Event()
+        calls = []
+
+        def job(name):
+            calls.append(name)
+            if len(calls) >= 3:
+                reached.set()
+                return
+            # 回调出错时仍然安排下一次执行
+            raise RuntimeError("boom")
+
+        with self.assertLogs(server.logger, 'ERROR'):
+            self.scheduler.call_every(0.01, job, 'cleanup')
+            self.assertTrue(reached.wait(5))
+        self.assertEqual(calls[:3], ['cleanup'] * 3)
+
+    def test_call_every_waits_one_interval_before_first_run(self):
+        calls = []
+        self.scheduler.call_every(60, calls.append, 'hourly')
+        done = threading.Event()
+        self.scheduler.call_later(0.05, done.set)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
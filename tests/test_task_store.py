@@ -0,0 +1,125 @@
+"""TaskStore 状态计数测试"""
+
+import threading
+import unittest
+
+from support import load_server, make_task
+
+server = load_server()
+TaskStatus = server.TaskStatus
+
+
+class TaskStoreCountTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = server.TaskStore(shard_count=4)
+
+    def assertCounts(self, **expected):
+        counts = self.store.status_counts()
+        for status in TaskStatus:
+            self.assertEqual(counts[status], expected.get(status.name.lower(), 0), status)
+        self.assertEqual(len(self.store), sum(expected.values()))
+
+    def test_put_counts_new_task(self):
+        self.store.put(make_task(server, "a"))
+        self.store.put(make_task(server, "b", TaskStatus.COMPLETED))
+        self.assertCounts(pending=1, completed=1)
+
+    def test_put_replaces_existing_task(self):
+        self.store.put(make_task(server, "a", TaskStatus.FAILED))
+        self.store.put(make_task(server, "a", TaskStatus.COMPLETED))
+        self.assertCounts(completed=1)
+
+    def test_remove(self):
+        task = make_task(server, "a")
+        self.store.put(task)
+        self.assertTrue(self.store.remove("a"))
+        self.assertFalse(self.store.remove("a"))
+        self.assertIsNone(self.store.get("a"))
+        self.assertCounts()
+
+    def test_remove_expected_skips_replaced_task(self):
+        old_task = make_task(server, "a", TaskStatus.COMPLETED)
+        self.store.put(old_task)
+        new_task = make_task(server, "a")
+        self.store.put(new_task)
+        self.assertFalse(self.store.remove("a", expected=old_task))
+        self.assertIs(self.store.get("a"), new_task)
+        self.assertCounts(pending=1)
+
+    def test_transition_moves_count(self):
+        task = make_task(server, "a")
+        self.store.put(task)
+        self.assertTrue(self.store.transition(task, TaskStatus.DOWNLOADING, progress=0.5))
+        self.assertEqual(task.status, TaskStatus.DOWNLOADING)
+        self.assertEqual(task.progress, 0.5)
+        self.assertCounts(downloading=1)
+
+    def test_transition_respects_allowed_from(self):
+        task = make_task(server, "a")
+        self.store.put(task)
+        self.store.transition(task, TaskStatus.CANCELLED, allowed_from=server.ACTIVE_STATUSES)
+        # 下载结束时任务已被取消：不能再变回 COMPLETED
+        self.assertFalse(self.store.transition(task, TaskStatus.COMPLETED,
+                                               allowed_from=(TaskStatus.DOWNLOADING,)))
+        self.assertEqual(task.status, TaskStatus.CANCELLED)
+        self.assertCounts(cancelled=1)
+
+    def test_transition_of_detached_task_does_not_count(self):
+        old_task = make_task(server, "a")
+        self.store.put(old_task)
+        self.store.put(make_task(server, "a", TaskStatus.COMPLETED))
+        self.assertTrue(self.store.transition(old_task, TaskStatus.FAILED))
+        self.store.put(make_task(server, "b"))
+        removed = self.store.get("b")
+        self.store.remove("b")
+        self.store.transition(removed, TaskStatus.DOWNLOADING)
+        self.assertCounts(completed=1)
+
+    def test_concurrent_transitions_keep_counts_consistent(self):
+        tasks = [make_task(server, f"v{i}") for i in range(200)]
+        for task in tasks:
+            self.store.put(task)
+
+        def worker(chunk):
+            for task in chunk:
+                self.store.transition(task, TaskStatus.DOWNLOADING, allowed_from=(TaskStatus.PENDING,))
+                self.store.transition(task, TaskStatus.COMPLETED, allowed_from=(TaskStatus.DOWNLOADING,))
+
+        # 每个任务由两个线程同时推进，allowed_from 保证每个转换只生效一次
+        threads = [threading.Thread(target=worker, args=(tasks,)) for _ in range(2)]
+        threads += [threading.Thread(target=worker, args=(tasks[::-1],)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertCounts(completed=200)
+
+    def test_status_counts_waits_for_shard_lock(self):
+        task = make_task(server, "locked")
+        self.store.put(task)
+        held = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def hold_lock():
+            with self.store.lock_for("locked"):
+                held.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        self.assertTrue(held.wait(5))
+        reader = threading.Thread(target=lambda: results.append(self.store.status_counts()))
+        reader.start()
+        # 分片被其他线程锁住时不读取其计数，避免与并发修改冲突
+        reader.join(0.05)
+        self.assertEqual(results, [])
+        release.set()
+        reader.join(5)
+        holder.join(5)
+        self.assertEqual(results[0][TaskStatus.PENDING], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""请求参数校验测试"""
+
+import unittest
+from unittest import mock
+
+from support import load_server
+
+server = load_server()
+
+
+class VideoIdValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def test_trailing_newline_is_rejected(self):
+        with mock.patch.object(server, 'run_in_pool') as run_in_pool:
+            response = self.client.get('/api/video/info?id=dQw4w9WgXcQ%0A')
+        self.assertEqual(response.status_code, 400)
+        run_in_pool.assert_not_called()
+
+    def test_detailed_lookup_rejects_trailing_newline(self):
+        with self.assertRaises(ValueError):
+            server.get_video_info_detailed('dQw4w9WgXcQ\n')
+
+    def test_valid_id_is_accepted(self):
+        with mock.patch.object(server, 'run_in_pool', return_value={'id': 'dQw4w9WgXcQ'}):
+            response = self.client.get('/api/video/info?id=dQw4w9WgXcQ')
+        self.assertEqual(response.status_code, 200)
+
+
+class ChannelIdValidationTest(unittest.TestCase):
+
+    CHANNEL_ID = 'UC' + 'x' * 22
+
+    def test_channel_id_is_returned_directly(self):
+        with mock.patch.object(server, 'load_cache') as load_cache:
+            self.assertEqual(server.resolve_channel_id(self.CHANNEL_ID), self.CHANNEL_ID)
+        load_cache.assert_not_called()
+
+    def test_trailing_newline_is_not_a_channel_id(self):
+        with mock.patch.object(server, 'load_cache', return_value=(None, 0.0)), \
+                mock.patch.object(server, '_probe_channel_url', return_value=None) as probe:
+            server.resolve_channel_id(self.CHANNEL_ID + '\n')
+        probe.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
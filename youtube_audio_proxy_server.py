@@ -7,17 +7,22 @@ YouTube Audio Download Server
 1. 完整下载mp3音频文件和srt英文字幕文件到本地
 2. 支持断点续传和下载管理
 3. 提供HTTP文件服务，支持Range请求
-4. 自动缓存管理（12小时过期 + LRU清理）
+4. 自动缓存管理（信息缓存12小时过期 + LRU清理；下载文件超过12小时且磁盘使用率达到高水位时清理）
 5. 下载任务队列和进度跟踪
 6. 使用yt-dlp替代YouTube Data API v3获取频道和视频信息
 7. 优化的无认证配置，提高稳定性和兼容性
 
 部署要求:
 1. Python 3.8+
-2. pip install flask yt-dlp
+2. pip install "flask>=2.0" yt-dlp
+3. 可选加速: pip install orjson
 
 启动命令:
 python3 youtube_audio_proxy_server.py
+# 或使用 gunicorn（配置见 gunicorn.conf.py）
+gunicorn -c gunicorn.conf.py youtube_audio_proxy_server:app
+# 或使用 waitress（pip install waitress，线程数由 THREADS 控制）
+WAITRESS=1 THREADS=16 python3 youtube_audio_proxy_server.py
 
 服务端口: 5000
 API端点:
@@ -39,6 +44,7 @@ API端点:
 import yt_dlp
 from flask import Flask, Response, request, abort, jsonify, send_file
 import urllib.request
+import urllib.parse
 import logging
 import sys
 import os
@@ -46,15 +52,30 @@ import json
 import time
 import threading
 import hashlib
+import functools
+import heapq
+import itertools
+import random
+import queue
+import atexit
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Tuple
+from collections import OrderedDict, Counter, namedtuple
 import uuid
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, Future, wait, TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, field, replace
 from enum import Enum
-import shutil
 import mimetypes
 import re
+import sqlite3
+import errno
+from types import MappingProxyType
+
+try:
+    import orjson  # 可选依赖：更快的 JSON 序列化/解析
+except ImportError:
+    orjson = None
 
 app = Flask(__name__)
 
@@ -69,6 +90,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# yt-dlp 版本（模块顶部已导入 yt_dlp，缺少依赖时导入阶段就会失败）
+YTDLP_VERSION = yt_dlp.version.__version__
+
 # 创建下载目录
 DOWNLOAD_DIR = Path('./downloads')
 DOWNLOAD_DIR.mkdir(exist_ok=True)
@@ -77,8 +101,25 @@ DOWNLOAD_DIR.mkdir(exist_ok=True)
 CACHE_DIR = Path('./cache')
 CACHE_DIR.mkdir(exist_ok=True)
 
+# 缓存数据库（频道和视频信息统一存放在单个 SQLite 文件中）
+CACHE_DB = CACHE_DIR / 'cache.db'
+
 # 缓存过期时间（12小时）
 CACHE_EXPIRE_HOURS = 12
+CACHE_EXPIRE_SECONDS = CACHE_EXPIRE_HOURS * 3600
+
+# 下载目录所在磁盘的使用率水位：定期清理只在使用率达到高水位时删除过期下载文件，
+# 删除到低于低水位为止；高水位设为 0 时每次清理都删除全部过期文件
+CLEANUP_DISK_HIGH_WATERMARK = float(os.environ.get('CLEANUP_DISK_HIGH_WATERMARK', 0.8))
+CLEANUP_DISK_LOW_WATERMARK = float(os.environ.get('CLEANUP_DISK_LOW_WATERMARK', 0.6))
+
+# 音频/字幕文件交给前端服务器发送（内核 sendfile，Python 不再逐块搬运文件内容）
+#   ""         - 默认，由 Flask send_file 发送
+#   "nginx"    - 返回 X-Accel-Redirect，需要 nginx 配置对应的 internal location
+#   "sendfile" - 返回 X-Sendfile（Apache mod_xsendfile / lighttpd）
+STATIC_OFFLOAD = os.environ.get('STATIC_OFFLOAD', '').lower()
+# nginx 中映射到下载目录的 internal location 前缀
+ACCEL_REDIRECT_PREFIX = os.environ.get('ACCEL_REDIRECT_PREFIX', '/protected/')
 
 # 移除 Cookies 配置，使用更稳定的无认证方式
 
@@ -90,6 +131,10 @@ class TaskStatus(Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+# 进行中 / 已结束的任务状态集合（集合成员判断不必每次构造列表）
+ACTIVE_STATUSES = frozenset({TaskStatus.PENDING, TaskStatus.DOWNLOADING})
+FINISHED_STATUSES = frozenset({TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED})
+
 @dataclass
 class DownloadTask:
     task_id: str
@@ -97,27 +142,207 @@ class DownloadTask:
     status: TaskStatus
     progress: float
     message: str
-    audio_file: Optional[str] = None
-    subtitle_file: Optional[str] = None
+    audio_file: Optional[str] = None  # 真实路径（os.path.realpath），便于清理时直接比较
+    subtitle_file: Optional[str] = None  # 同上
     error: Optional[str] = None
     created_at: datetime = None
     completed_at: Optional[datetime] = None
     video_info: Optional[Dict] = None
+    future: Optional[Future] = None
+    # 任务锁：下载线程与请求线程之间的复合读写（进度、状态等）在锁内进行
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
+    
+    def update(self, **changes):
+        """在任务锁内批量更新字段（状态变化请使用 TaskStore.transition）"""
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+    
+    def snapshot(self) -> 'DownloadTask':
+        """获取任务当前状态的一致性快照（浅拷贝）"""
+        with self._lock:
+            return replace(self)
+
+class TaskStore:
+    """分片任务表：按 video_id 哈希分到多个分片，每个分片有自己的锁和各状态的任务计数
+    
+    任务状态只通过 transition() 修改，同时更新所在分片的计数，
+    统计各状态任务数量时汇总分片计数即可，无需遍历全部任务。
+    加锁顺序固定为 分片锁 -> 任务锁。
+    """
+    
+    def __init__(self, shard_count: int = 16):
+        self._shards: List[Dict[str, DownloadTask]] = [{} for _ in range(shard_count)]
+        self._locks = [threading.RLock() for _ in range(shard_count)]
+        self._counts = [Counter() for _ in range(shard_count)]
+    
+    def _index(self, video_id: str) -> int:
+        return hash(video_id) % len(self._shards)
+    
+    def lock_for(self, video_id: str) -> threading.RLock:
+        """获取 video_id 所在分片的锁，用于"检查后创建"等复合操作"""
+        return self._locks[self._index(video_id)]
+    
+    def get(self, video_id: str) -> Optional[DownloadTask]:
+        """查询任务（单次字典读取在 CPython 中是原子的，无需加锁）"""
+        return self._shards[self._index(video_id)].get(video_id)
+    
+    def put(self, task: DownloadTask):
+        """添加任务，已有同一视频的记录时替换"""
+        i = self._index(task.video_id)
+        with self._locks[i]:
+            old_task = self._shards[i].get(task.video_id)
+            if old_task is not None:
+                self._counts[i][old_task.status] -= 1
+            self._shards[i][task.video_id] = task
+            self._counts[i][task.status] += 1
+    
+    def remove(self, video_id: str, expected: Optional[DownloadTask] = None) -> bool:
+        """删除任务记录；指定 expected 时只在记录仍是该任务时删除，返回是否删除"""
+        i = self._index(video_id)
+        with self._locks[i]:
+            task = self._shards[i].get(video_id)
+            if task is None or (expected is not None and task is not expected):
+                return False
+            del self._shards[i][video_id]
+            self._counts[i][task.status] -= 1
+            return True
+    
+    def transition(self, task: DownloadTask, status: TaskStatus, allowed_from=None, **changes) -> bool:
+        """修改任务状态和其他字段并更新计数；指定 allowed_from 时只从其中的状态转换，返回是否修改"""
+        i = self._index(task.video_id)
+        with self._locks[i], task._lock:
+            old_status = task.status
+            if allowed_from is not None and old_status not in allowed_from:
+                return False
+            task.status = status
+            for name, value in changes.items():
+                setattr(task, name, value)
+            # 已被替换或删除的任务不再计入统计
+            if self._shards[i].get(task.video_id) is task:
+                self._counts[i][old_status] -= 1
+                self._counts[i][status] += 1
+            return True
+    
+    def values(self) -> List[DownloadTask]:
+        """所有任务的列表副本（逐个分片加锁复制引用）"""
+        result = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                result.extend(shard.values())
+        return result
+    
+    def status_counts(self) -> Counter:
+        """一次汇总各分片的状态计数，返回 {TaskStatus: 数量}（逐个分片加锁复制计数）"""
+        total = Counter()
+        for counts, lock in zip(self._counts, self._locks):
+            with lock:
+                counts = counts.copy()
+            total.update(counts)
+        return total
+    
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
 
 # 全局任务管理
-tasks: Dict[str, DownloadTask] = {}
-download_threads: Dict[str, threading.Thread] = {}
+tasks = TaskStore()
+
+# 线程池：限制同时进行的下载任务和 yt-dlp 元数据请求数量
+# 避免每个请求创建新线程，同时减少并发访问 YouTube 触发的限流/机器人验证
+# ATP（异步任务池）：频道/视频信息等纯网络请求，不会被耗时的音频下载阻塞
+# WTP（工作任务池）：音频+字幕下载及 ffmpeg 转码，并发数可通过 DOWNLOAD_WORKERS 环境变量调整
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 2))
+ATP = ThreadPoolExecutor(max_workers=8, thread_name_prefix="atp")
+WTP = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="wtp")
+METADATA_TIMEOUT = 45  # 元数据请求等待超时（秒）
+
+# 下载前随机等待的时间范围（秒），分散对 YouTube 的请求
+# 等待由调度线程负责，不占用下载线程池
+PRE_DOWNLOAD_SLEEP_MIN = 1
+PRE_DOWNLOAD_SLEEP_MAX = 3
+
+class DelayedScheduler:
+    """基于最小堆的延时调度：单个线程等待所有到期时间，到期后执行回调"""
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+    
+    def call_later(self, delay: float, func, *args):
+        """在 delay 秒后调用 func(*args)，回调应尽快返回（耗时工作提交到线程池）"""
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), func, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+    
+    def call_every(self, interval: float, func, *args):
+        """每隔 interval 秒调用一次 func(*args)（首次在 interval 秒后），定期任务共用同一个调度线程"""
+        def tick():
+            try:
+                func(*args)
+            finally:
+                self.call_later(interval, tick)
+        self.call_later(interval, tick)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    remaining = self._heap[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                _, _, func, args = heapq.heappop(self._heap)
+            
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"❌ 调度任务执行失败: {e}")
+
+scheduler = DelayedScheduler("scheduler")
+
+def run_in_pool(func, *args, pool: ThreadPoolExecutor = ATP, timeout: float = METADATA_TIMEOUT):
+    """在指定线程池中执行函数并等待结果
+    
+    等待超时时取消仍在排队的任务（已开始执行的无法取消），并抛出 FuturesTimeoutError
+    """
+    future = pool.submit(func, *args)
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        future.cancel()
+        raise
+
+def pool_timeout_error(what: str) -> Dict[str, str]:
+    """线程池等待超时时返回给客户端的错误信息"""
+    logger.warning(f"⏱️ {what}超时（{METADATA_TIMEOUT} 秒）")
+    return {"error": f"Timed out after {METADATA_TIMEOUT}s waiting for {what}, please retry later"}
 
 # =============================================================================
 # YouTube 数据获取功能（替代 YouTube Data API v3）
 # =============================================================================
 
-def get_common_ydl_opts() -> dict:
-    """获取通用的 yt-dlp 配置，使用最简化和稳定的设置"""
+# 基础 HTTP 头，模块级只读常量
+# 如需轮换 User-Agent，只需在这里替换（而不是每次请求重新生成）
+_HTTP_HEADERS = MappingProxyType({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+})
+
+def _build_common_ydl_opts() -> dict:
+    """构建通用的 yt-dlp 配置，使用最简化和稳定的设置"""
     opts = {
         # 使用最基础的配置，避免复杂的 extractor_args
         'socket_timeout': 60,
@@ -126,15 +351,10 @@ def get_common_ydl_opts() -> dict:
         'skip_unavailable_fragments': True,
         'extractor_retries': 5,
         'file_access_retries': 5,
-        'sleep_interval': 1,
-        'max_sleep_interval': 3,
         'sleep_interval_requests': 1,
         'sleep_interval_subtitles': 0,
         # 基础 HTTP 头
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-        },
+        'http_headers': _HTTP_HEADERS,
         # 基础选项
         'no_warnings': False,  # 显示警告以便调试
         'ignoreerrors': False,  # 不忽略错误，便于调试
@@ -144,40 +364,291 @@ def get_common_ydl_opts() -> dict:
     logger.info("🔧 使用简化的 yt-dlp 配置")
     return opts
 
-def get_cache_path(cache_type: str, identifier: str) -> Path:
-    """获取缓存文件路径"""
-    safe_id = hashlib.md5(identifier.encode()).hexdigest()[:12]
-    return CACHE_DIR / f"{cache_type}_{safe_id}_{identifier.replace('/', '_')}.json"
+# 通用配置只在启动时构建一次，只读视图防止调用方合并参数时意外修改
+_COMMON_YDL_OPTS = MappingProxyType(_build_common_ydl_opts())
 
-def is_cache_valid(cache_path: Path) -> bool:
-    """检查缓存是否有效（未过期）"""
-    if not cache_path.exists():
-        return False
+# 同时访问 YouTube 的 yt-dlp 提取请求上限
+# yt-dlp 没有异步接口，这里用信号量在线程池之上进一步限制并发，降低被限流的概率
+YOUTUBE_CONCURRENCY = 2
+_youtube_semaphore = threading.BoundedSemaphore(YOUTUBE_CONCURRENCY)
+
+def extract_info(ydl: yt_dlp.YoutubeDL, url: str) -> Optional[dict]:
+    """提取信息（不下载），限制同时访问 YouTube 的请求数"""
+    with _youtube_semaphore:
+        return ydl.extract_info(url, download=False)
+
+# 复用 yt-dlp 实例，避免每次调用都重新初始化 extractor
+# yt-dlp 实例不是线程安全的，因此每个线程按配置类型各持有一个实例
+_YDL_PROFILES = {
+    'flat': {'quiet': True, 'skip_download': True, 'extract_flat': True},
+    # 播放列表条目只返回基础信息，不再逐个视频获取完整格式列表
+    'channel': {'quiet': True, 'skip_download': True, 'extract_flat': 'in_playlist'},
+    'video': {'quiet': True, 'skip_download': True, 'extract_flat': False, 'noplaylist': True},
+}
+_ydl_local = threading.local()
+
+def get_ydl(profile: str, playlist_items: Optional[str] = None) -> yt_dlp.YoutubeDL:
+    """获取当前线程复用的 yt-dlp 实例，playlist_items 按次调用设置"""
+    instances = getattr(_ydl_local, 'instances', None)
+    if instances is None:
+        instances = _ydl_local.instances = {}
+    
+    ydl = instances.get(profile)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL({**_YDL_PROFILES[profile], **_COMMON_YDL_OPTS})
+        instances[profile] = ydl
+    
+    ydl.params['playlist_items'] = playlist_items
+    return ydl
+
+def init_cache_db():
+    """创建缓存表并启用 WAL 模式（读写互不阻塞），进程启动时执行一次
     
-    file_time = datetime.fromtimestamp(cache_path.stat().st_mtime)
-    return datetime.now() - file_time < timedelta(hours=CACHE_EXPIRE_HOURS)
+    WAL 模式保存在数据库文件中，之后打开的连接无需再次设置
+    """
+    try:
+        conn = sqlite3.connect(str(CACHE_DB), timeout=10)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS cache '
+                    '(key TEXT PRIMARY KEY, type TEXT, mtime REAL, blob BLOB) WITHOUT ROWID'
+                )
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"❌ 初始化缓存数据库失败: {e}")
+
+init_cache_db()
+
+_cache_db_local = threading.local()
+
+def get_cache_db() -> sqlite3.Connection:
+    """获取当前线程的缓存数据库连接
+    
+    threaded 模式下每个请求都在新线程中处理，这里只建立连接，不执行建表和 PRAGMA
+    """
+    conn = getattr(_cache_db_local, 'conn', None)
+    if conn is None:
+        conn = _cache_db_local.conn = sqlite3.connect(str(CACHE_DB), timeout=10)
+    return conn
+
+def json_dumps(data: Any) -> bytes:
+    """序列化为紧凑的 JSON 字节串，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+def json_loads(raw: bytes) -> Any:
+    """解析 JSON 字节串，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
-def save_cache(cache_path: Path, data: dict):
-    """保存数据到缓存"""
+# 缓存写入队列：请求线程只负责序列化和入队，由单个后台线程批量提交到数据库
+CACHE_WRITE_BATCH = 64
+CACHE_WRITE_Q: "queue.Queue[tuple]" = queue.Queue(maxsize=1000)
+_cache_writer_thread = None
+_cache_writer_lock = threading.Lock()
+
+def _write_cache_rows(rows: List[tuple]):
+    """在一个事务中写入多条缓存记录"""
+    conn = get_cache_db()
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO cache (key, type, mtime, blob) VALUES (?, ?, ?, ?)',
+            rows
+        )
+
+def _cache_writer():
+    """后台写缓存：一次取出队列中已有的记录，合并为一个事务提交"""
+    # 写线程常驻，只需设置一次；WAL 模式下 NORMAL 不会损坏数据库，只是断电时可能丢失最近的提交
     try:
-        cache_path.parent.mkdir(exist_ok=True)
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        get_cache_db().execute('PRAGMA synchronous=NORMAL')
     except Exception as e:
-        logger.warning(f"⚠️ 保存缓存失败 {cache_path}: {e}")
+        logger.warning(f"⚠️ 设置缓存数据库同步模式失败: {e}")
+    
+    while True:
+        rows = [CACHE_WRITE_Q.get()]
+        while len(rows) < CACHE_WRITE_BATCH:
+            try:
+                rows.append(CACHE_WRITE_Q.get_nowait())
+            except queue.Empty:
+                break
+        
+        try:
+            _write_cache_rows(rows)
+        except Exception as e:
+            logger.warning(f"⚠️ 批量保存缓存失败 ({len(rows)} 条): {e}")
+        finally:
+            for _ in rows:
+                CACHE_WRITE_Q.task_done()
 
-def load_cache(cache_path: Path) -> Optional[dict]:
-    """从缓存加载数据"""
-    if not is_cache_valid(cache_path):
-        return None
+def _ensure_cache_writer():
+    """首次写缓存时启动后台写线程"""
+    global _cache_writer_thread
+    if _cache_writer_thread is not None:
+        return
+    with _cache_writer_lock:
+        if _cache_writer_thread is None:
+            _cache_writer_thread = threading.Thread(target=_cache_writer, name="cache-writer", daemon=True)
+            _cache_writer_thread.start()
+
+def flush_cache_writes():
+    """等待队列中的缓存写入全部完成"""
+    if _cache_writer_thread is not None:
+        CACHE_WRITE_Q.join()
+
+# 进程退出前把尚未写入的缓存落盘
+atexit.register(flush_cache_writes)
+
+def save_cache(cache_key: str, data: Any):
+    """保存数据到缓存，cache_key 格式为 "类型:标识"；实际写入由后台线程完成"""
+    try:
+        row = (cache_key, cache_key.partition(':')[0], time.time(), json_dumps(data))
+    except Exception as e:
+        logger.warning(f"⚠️ 保存缓存失败 {cache_key}: {e}")
+        return
     
+    _ensure_cache_writer()
+    try:
+        CACHE_WRITE_Q.put_nowait(row)
+    except queue.Full:
+        # 队列积压时退回同步写入，避免丢失缓存
+        logger.warning(f"⚠️ 缓存写入队列已满，同步写入: {cache_key}")
+        try:
+            _write_cache_rows([row])
+        except Exception as e:
+            logger.warning(f"⚠️ 保存缓存失败 {cache_key}: {e}")
+
+def load_cache(cache_key: str) -> Tuple[Optional[Any], float]:
+    """从缓存加载未过期的数据，返回 (数据, 写入时间)；不存在时返回 (None, 0.0)"""
+    try:
+        row = get_cache_db().execute(
+            'SELECT blob, mtime FROM cache WHERE key = ? AND mtime > ?',
+            (cache_key, time.time() - CACHE_EXPIRE_SECONDS)
+        ).fetchone()
+        return (json_loads(row[0]), row[1]) if row else (None, 0.0)
+    except Exception as e:
+        logger.warning(f"⚠️ 读取缓存失败 {cache_key}: {e}")
+        return None, 0.0
+
+def purge_expired_cache() -> int:
+    """删除过期的缓存记录，返回删除数量"""
+    try:
+        conn = get_cache_db()
+        with conn:
+            cursor = conn.execute(
+                'DELETE FROM cache WHERE mtime < ?',
+                (time.time() - CACHE_EXPIRE_SECONDS,)
+            )
+        return cursor.rowcount
+    except Exception as e:
+        logger.error(f"❌ 清理缓存数据库失败: {e}")
+        return 0
+
+def count_cache_entries() -> int:
+    """统计缓存记录数量"""
+    try:
+        return get_cache_db().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+    except Exception as e:
+        logger.warning(f"⚠️ 统计缓存失败: {e}")
+        return 0
+
+# 内存缓存：位于磁盘缓存之前的 LRU + TTL 层，热点数据无需 stat/open/解析 JSON
+MEM_CACHE_MAX_ENTRIES = 1024
+_MEM_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+_MEM_LOCK = threading.Lock()
+
+def mem_get(key: str, ttl: float) -> Optional[Any]:
+    """从内存缓存获取数据，不存在或超过 ttl 秒返回 None"""
+    with _MEM_LOCK:
+        entry = _MEM_CACHE.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at >= ttl:
+            del _MEM_CACHE[key]
+            return None
+        _MEM_CACHE.move_to_end(key)
+        return value
+
+def mem_put(key: str, value: Any, stored_at: Optional[float] = None):
+    """写入内存缓存，超出容量时淘汰最久未使用的条目
+    
+    stored_at 为数据产生时的 time.monotonic() 值，默认为当前时间
+    """
+    if stored_at is None:
+        stored_at = time.monotonic()
+    with _MEM_LOCK:
+        _MEM_CACHE[key] = (stored_at, value)
+        _MEM_CACHE.move_to_end(key)
+        if len(_MEM_CACHE) > MEM_CACHE_MAX_ENTRIES:
+            _MEM_CACHE.popitem(last=False)
+
+def mem_put_from_disk(key: str, value: Any, mtime: float):
+    """把磁盘缓存中的数据提升到内存缓存，保留其原始写入时间，过期时间不因提升而延长"""
+    mem_put(key, value, stored_at=time.monotonic() - (time.time() - mtime))
+
+# 进行中的请求合并表：相同参数的并发请求只访问一次 YouTube，其余请求等待同一个结果
+_INFLIGHT: Dict[tuple, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+INFLIGHT_TIMEOUT = 60  # 等待其他请求结果的超时（秒）
+
+def coalesced(func):
+    """装饰器：合并参数相同的并发调用"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        with _INFLIGHT_LOCK:
+            future = _INFLIGHT.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = _INFLIGHT[key] = Future()
+        
+        if not is_owner:
+            return future.result(timeout=INFLIGHT_TIMEOUT)
+        
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(key, None)
+    return wrapper
+
+# 频道ID格式：UC + 22 个字符
+_UC_RE = re.compile(r'UC[\w-]{22}')
+# 视频ID格式：11 个字符
+_VID_RE = re.compile(r'[A-Za-z0-9_-]{11}')
+# 搜索关键词中不允许的字符（引号等会破坏 ytsearch 查询语法）
+_Q_RE = re.compile(r'[^\w\s\-+.:]')
+SEARCH_QUERY_MAX_LENGTH = 64
+
+# 常用 URL 模板，预先绑定 format 方法
+_THUMB_TMPL = "https://img.youtube.com/vi/{}/maxresdefault.jpg".format
+_WATCH_TMPL = "https://www.youtube.com/watch?v={}".format
+
+def truncate(text: Optional[str], limit: int) -> str:
+    """截断文本，空值返回空字符串"""
+    return text[:limit] if text else ''
+
+def _probe_channel_url(url: str) -> Optional[str]:
+    """通过频道 URL 获取频道ID，失败返回 None"""
     try:
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        info = extract_info(get_ydl('flat'), url)
     except Exception as e:
-        logger.warning(f"⚠️ 读取缓存失败 {cache_path}: {e}")
+        logger.debug(f"⚠️ 解析失败 {url}: {e}")
         return None
+    return info.get('channel_id') if info else None
 
+@coalesced
 def resolve_channel_id(input_str: str) -> str:
     """解析频道ID，支持多种输入格式"""
     logger.info(f"🔍 解析频道标识: {input_str}")
@@ -187,40 +658,35 @@ def resolve_channel_id(input_str: str) -> str:
         input_str = input_str[1:]
     
     # 如果已经是频道ID格式（UC开头且长度为24），直接返回
-    if input_str.startswith('UC') and len(input_str) == 24:
+    if _UC_RE.fullmatch(input_str):
         logger.info(f"✅ 识别为频道ID: {input_str}")
         return input_str
     
     # 检查缓存
-    cache_path = get_cache_path("channel_resolve", input_str)
-    cached_data = load_cache(cache_path)
+    cache_key = f"channel_resolve:{input_str}"
+    channel_id = mem_get(cache_key, CACHE_EXPIRE_SECONDS)
+    if channel_id:
+        return channel_id
+    
+    cached_data, cached_mtime = load_cache(cache_key)
     if cached_data and 'channel_id' in cached_data:
         logger.info(f"📦 从缓存获取频道ID: {cached_data['channel_id']}")
+        mem_put_from_disk(cache_key, cached_data['channel_id'], cached_mtime)
         return cached_data['channel_id']
     
     try:
-        # 使用最简单的方法解析频道ID
-        ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-            'extract_flat': True,
-            **get_common_ydl_opts(),
-        }
-        
-        # 优先尝试 @ 格式，这是最新的标准格式
+        # 尝试 @ 格式，这是最新的标准格式
         url = f'https://www.youtube.com/@{input_str}'
         logger.info(f"🔍 尝试解析: {url}")
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        channel_id = _probe_channel_url(url)
+        if channel_id:
+            logger.info(f"✅ 获取到频道ID: {channel_id}")
             
-            if info and 'channel_id' in info:
-                channel_id = info['channel_id']
-                logger.info(f"✅ 获取到频道ID: {channel_id}")
-                
-                # 保存到缓存
-                save_cache(cache_path, {'channel_id': channel_id, 'resolved_from': url})
-                return channel_id
+            # 保存到缓存
+            save_cache(cache_key, {'channel_id': channel_id, 'resolved_from': url})
+            mem_put(cache_key, channel_id)
+            return channel_id
         
         # 如果 @ 格式失败，直接返回输入（假设它就是频道ID）
         logger.warning(f"⚠️ 无法解析频道标识，假设为频道ID: {input_str}")
@@ -231,6 +697,7 @@ def resolve_channel_id(input_str: str) -> str:
         # 返回原始输入作为频道ID
         return input_str
 
+@coalesced
 def get_channel_info(channel_input: str) -> dict:
     """获取频道信息"""
     logger.info(f"📺 获取频道信息: {channel_input}")
@@ -239,58 +706,58 @@ def get_channel_info(channel_input: str) -> dict:
     channel_id = resolve_channel_id(channel_input)
     
     # 检查缓存
-    cache_path = get_cache_path("channel_info", channel_id)
-    cached_data = load_cache(cache_path)
+    cache_key = f"channel_info:{channel_id}"
+    cached_data = mem_get(cache_key, CACHE_EXPIRE_SECONDS)
+    if cached_data:
+        return cached_data
+    
+    cached_data, cached_mtime = load_cache(cache_key)
     if cached_data:
         logger.info(f"📦 从缓存获取频道信息: {cached_data.get('title', 'Unknown')}")
+        mem_put_from_disk(cache_key, cached_data, cached_mtime)
         return cached_data
     
     try:
-        ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-            'extract_flat': False,
-            'playlist_items': '1:5',  # 获取前5个视频来得到频道详细信息
-            **get_common_ydl_opts(),  # 添加通用配置
+        # 频道级字段（标题、缩略图等）来自频道页本身，前5个视频只需扁平条目用于缩略图回退
+        ydl = get_ydl('channel', playlist_items='1:5')
+        info = extract_info(ydl, f'https://www.youtube.com/channel/{channel_id}/videos')
+        
+        if not info:
+            raise Exception("无法获取频道信息")
+        
+        # 提取频道信息
+        channel_info = {
+            'channel_id': channel_id,
+            'title': info.get('title', ''),
+            'description': truncate(info.get('description'), 500),
+            'subscriber_count': info.get('subscriber_count'),
+            'video_count': len(info.get('entries', [])) if 'entries' in info else 0,
+            'thumbnail': info.get('thumbnail') or (info.get('thumbnails', [{}])[-1].get('url', '') if info.get('thumbnails') else ''),
+            'uploader': info.get('uploader', info.get('title', '')),
+            'webpage_url': f'https://www.youtube.com/channel/{channel_id}',
+            'updated_at': datetime.now().isoformat()
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f'https://www.youtube.com/channel/{channel_id}/videos', download=False)
-            
-            if not info:
-                raise Exception("无法获取频道信息")
-            
-            # 提取频道信息
-            channel_info = {
-                'channel_id': channel_id,
-                'title': info.get('title', ''),
-                'description': (info.get('description', '') or '')[:500],
-                'subscriber_count': info.get('subscriber_count'),
-                'video_count': len(info.get('entries', [])) if 'entries' in info else 0,
-                'thumbnail': info.get('thumbnail') or (info.get('thumbnails', [{}])[-1].get('url', '') if info.get('thumbnails') else ''),
-                'uploader': info.get('uploader', info.get('title', '')),
-                'webpage_url': f'https://www.youtube.com/channel/{channel_id}',
-                'updated_at': datetime.now().isoformat()
-            }
-            
-            # 处理缩略图
-            if not channel_info['thumbnail'] and 'entries' in info and info['entries']:
-                # 如果没有频道缩略图，使用第一个视频的缩略图
-                first_video = info['entries'][0]
-                if 'thumbnails' in first_video and first_video['thumbnails']:
-                    channel_info['thumbnail'] = first_video['thumbnails'][-1].get('url', '')
-            
-            logger.info(f"✅ 获取频道信息成功: {channel_info['title']}")
-            
-            # 保存到缓存
-            save_cache(cache_path, channel_info)
-            
-            return channel_info
-            
+        # 处理缩略图
+        if not channel_info['thumbnail'] and 'entries' in info and info['entries']:
+            # 如果没有频道缩略图，使用第一个视频的缩略图
+            first_video = info['entries'][0]
+            if 'thumbnails' in first_video and first_video['thumbnails']:
+                channel_info['thumbnail'] = first_video['thumbnails'][-1].get('url', '')
+        
+        logger.info(f"✅ 获取频道信息成功: {channel_info['title']}")
+        
+        # 保存到缓存
+        save_cache(cache_key, channel_info)
+        mem_put(cache_key, channel_info)
+        
+        return channel_info
+        
     except Exception as e:
         logger.error(f"❌ 获取频道信息失败: {e}")
         raise Exception(f"获取频道信息失败: {str(e)}")
 
+@coalesced
 def get_channel_videos(channel_input: str, limit: int = 20) -> List[dict]:
     """获取频道视频列表 - 使用最简单稳定的方法"""
     logger.info(f"🎬 获取频道视频: {channel_input}, 数量限制: {limit}")
@@ -299,23 +766,20 @@ def get_channel_videos(channel_input: str, limit: int = 20) -> List[dict]:
     channel_id = resolve_channel_id(channel_input)
     
     # 检查缓存
-    cache_key = f"{channel_id}_{limit}"
-    cache_path = get_cache_path("channel_videos", cache_key)
-    cached_data = load_cache(cache_path)
+    cache_key = f"channel_videos:{channel_id}_{limit}"
+    cached_data = mem_get(cache_key, CACHE_EXPIRE_SECONDS)
+    if cached_data:
+        return cached_data
+    
+    cached_data, cached_mtime = load_cache(cache_key)
     if cached_data:
         logger.info(f"📦 从缓存获取频道视频: {len(cached_data)} 个视频")
+        mem_put_from_disk(cache_key, cached_data, cached_mtime)
         return cached_data
     
     try:
         # 使用最基础的配置
-        ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-            'extract_flat': True,
-            'playlist_items': f'1:{limit}',
-            'ignoreerrors': True,
-            **get_common_ydl_opts(),
-        }
+        ydl = get_ydl('flat', playlist_items=f'1:{limit}')
         
         # 尝试多种方法获取频道视频
         methods = [
@@ -340,71 +804,67 @@ def get_channel_videos(channel_input: str, limit: int = 20) -> List[dict]:
             try:
                 logger.info(f"🔍 尝试{method['name']}: {method['url']}")
                 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(method['url'], download=False)
-                    
-                    if not info or 'entries' not in info:
-                        logger.debug(f"⚠️ {method['name']}无结果")
+                info = extract_info(ydl, method['url'])
+                
+                if not info or 'entries' not in info:
+                    logger.debug(f"⚠️ {method['name']}无结果")
+                    continue
+                
+                videos = []
+                processed_count = 0
+                total_entries = len(info['entries'])
+                
+                logger.info(f"📋 {method['name']}返回 {total_entries} 个条目，开始过滤...")
+                
+                for entry in info['entries']:
+                    if not entry:
                         continue
+                        
+                    # 过滤掉频道分类（如 "videos", "live", "shorts"）
+                    entry_title = entry.get('title', '').lower()
+                    entry_id = entry.get('id', '')
                     
-                    videos = []
-                    processed_count = 0
-                    total_entries = len(info['entries'])
-                    
-                    logger.info(f"📋 {method['name']}返回 {total_entries} 个条目，开始过滤...")
+                    # 跳过明显的分类页面
+                    if (not entry_id or 
+                        entry_title in ['videos', 'live', 'shorts', 'playlists', 'community', 'channels', 'about'] or
+                        entry_title.endswith(' - videos') or
+                        entry_title.endswith(' - live') or
+                        entry_title.endswith(' - shorts')):
+                        logger.debug(f"🚫 跳过分类页面: {entry_title}")
+                        continue
                     
-                    for entry in info['entries']:
-                        if not entry:
-                            continue
-                            
-                        # 过滤掉频道分类（如 "videos", "live", "shorts"）
-                        entry_title = entry.get('title', '').lower()
-                        entry_id = entry.get('id', '')
-                        
-                        # 跳过明显的分类页面
-                        if (not entry_id or 
-                            entry_title in ['videos', 'live', 'shorts', 'playlists', 'community', 'channels', 'about'] or
-                            entry_title.endswith(' - videos') or
-                            entry_title.endswith(' - live') or
-                            entry_title.endswith(' - shorts')):
-                            logger.debug(f"🚫 跳过分类页面: {entry_title}")
-                            continue
-                        
-                        # 确保是有效的视频ID（YouTube视频ID通常是11个字符）
-                        if len(entry_id) != 11:
-                            logger.debug(f"🚫 跳过无效ID: {entry_id} (长度: {len(entry_id)})")
-                            continue
-                            
-                        video_info = {
-                            'video_id': entry_id,
-                            'title': entry.get('title', ''),
-                            'description': (entry.get('description', '') or '')[:200],
-                            'duration': entry.get('duration', 0),
-                            'upload_date': entry.get('upload_date', ''),
-                            'view_count': entry.get('view_count', 0),
-                            'thumbnail': f"https://img.youtube.com/vi/{entry_id}/maxresdefault.jpg",
-                            'webpage_url': f"https://www.youtube.com/watch?v={entry_id}"
-                        }
-                        
-                        # 尝试获取更好的缩略图
-                        if 'thumbnails' in entry and entry['thumbnails']:
-                            video_info['thumbnail'] = entry['thumbnails'][-1].get('url', video_info['thumbnail'])
-                        
-                        videos.append(video_info)
-                        processed_count += 1
+                    # 确保是有效的视频ID（YouTube视频ID通常是11个字符）
+                    if len(entry_id) != 11:
+                        logger.debug(f"🚫 跳过无效ID: {entry_id} (长度: {len(entry_id)})")
+                        continue
                         
-                        # 达到限制数量就停止
-                        if processed_count >= limit:
-                            break
+                    # 优先使用条目自带的最大缩略图，否则按视频ID拼接
+                    thumbnails = entry.get('thumbnails')
+                    videos.append({
+                        'video_id': entry_id,
+                        'title': entry.get('title', ''),
+                        'description': truncate(entry.get('description'), 200),
+                        'duration': entry.get('duration', 0),
+                        'upload_date': entry.get('upload_date', ''),
+                        'view_count': entry.get('view_count', 0),
+                        'thumbnail': (thumbnails and thumbnails[-1].get('url')) or _THUMB_TMPL(entry_id),
+                        'webpage_url': _WATCH_TMPL(entry_id)
+                    })
+                    processed_count += 1
+                    
+                    # 达到限制数量就停止
+                    if processed_count >= limit:
+                        break
+                
+                if videos:
+                    logger.info(f"✅ 通过{method['name']}获取到 {len(videos)} 个有效视频")
+                    # 保存到缓存
+                    save_cache(cache_key, videos)
+                    mem_put(cache_key, videos)
+                    return videos
+                else:
+                    logger.debug(f"⚠️ {method['name']}未获取到有效视频")
                     
-                    if videos:
-                        logger.info(f"✅ 通过{method['name']}获取到 {len(videos)} 个有效视频")
-                        # 保存到缓存
-                        save_cache(cache_path, videos)
-                        return videos
-                    else:
-                        logger.debug(f"⚠️ {method['name']}未获取到有效视频")
-                        
             except Exception as e:
                 logger.debug(f"⚠️ {method['name']}失败: {e}")
                 continue
@@ -418,131 +878,133 @@ def get_channel_videos(channel_input: str, limit: int = 20) -> List[dict]:
         # 返回空列表而不是抛出异常，让调用方处理
         return []
 
+@coalesced
 def get_video_info_detailed(video_id: str) -> dict:
     """获取视频详细信息（比基础的get_video_info更详细）"""
     logger.info(f"🎥 获取视频详细信息: {video_id}")
     
+    # 格式不正确的ID直接拒绝，不发起网络请求
+    if not _VID_RE.fullmatch(video_id):
+        raise ValueError(f"无效的视频ID: {video_id}")
+    
     # 检查缓存
-    cache_path = get_cache_path("video_detailed", video_id)
-    cached_data = load_cache(cache_path)
+    cache_key = f"video_detailed:{video_id}"
+    cached_data = mem_get(cache_key, CACHE_EXPIRE_SECONDS)
+    if cached_data:
+        return cached_data
+    
+    cached_data, cached_mtime = load_cache(cache_key)
     if cached_data:
         logger.info(f"📦 从缓存获取视频详细信息: {cached_data.get('title', 'Unknown')}")
+        mem_put_from_disk(cache_key, cached_data, cached_mtime)
         return cached_data
     
     try:
-        ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-            'extract_flat': False,
-            'noplaylist': True,
-            **get_common_ydl_opts(),  # 添加通用配置
+        ydl = get_ydl('video')
+        info = extract_info(ydl, f'https://www.youtube.com/watch?v={video_id}')
+        
+        if not info:
+            raise Exception("无法获取视频信息")
+        
+        # 提取详细视频信息
+        video_info = {
+            'id': video_id,  # iOS端期望字段名为'id'
+            'title': info.get('title', ''),
+            'description': truncate(info.get('description'), 500),
+            'duration': info.get('duration', 0),
+            'uploader': info.get('uploader', ''),
+            'channel_id': info.get('channel_id', ''),
+            'channel': info.get('channel', ''),
+            'view_count': info.get('view_count', 0),
+            'like_count': info.get('like_count', 0),
+            'upload_date': info.get('upload_date', ''),
+            'webpage_url': info.get('webpage_url', ''),
+            'thumbnail': '',
+            'updated_at': datetime.now().isoformat()
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-            
-            if not info:
-                raise Exception("无法获取视频信息")
-            
-            # 提取详细视频信息
-            video_info = {
-                'id': video_id,  # iOS端期望字段名为'id'
-                'title': info.get('title', ''),
-                'description': (info.get('description', '') or '')[:500],
-                'duration': info.get('duration', 0),
-                'uploader': info.get('uploader', ''),
-                'channel_id': info.get('channel_id', ''),
-                'channel': info.get('channel', ''),
-                'view_count': info.get('view_count', 0),
-                'like_count': info.get('like_count', 0),
-                'upload_date': info.get('upload_date', ''),
-                'webpage_url': info.get('webpage_url', ''),
-                'thumbnail': '',
-                'updated_at': datetime.now().isoformat()
-            }
-            
-            # 处理缩略图
-            if 'thumbnails' in info and info['thumbnails']:
-                video_info['thumbnail'] = info['thumbnails'][-1].get('url', '')
-            else:
-                video_info['thumbnail'] = f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
-            
-            logger.info(f"✅ 获取视频详细信息成功: {video_info['title']}")
-            
-            # 保存到缓存
-            save_cache(cache_path, video_info)
-            
-            return video_info
-            
+        # 处理缩略图
+        if 'thumbnails' in info and info['thumbnails']:
+            video_info['thumbnail'] = info['thumbnails'][-1].get('url', '')
+        else:
+            video_info['thumbnail'] = f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
+        
+        logger.info(f"✅ 获取视频详细信息成功: {video_info['title']}")
+        
+        # 保存到缓存
+        save_cache(cache_key, video_info)
+        mem_put(cache_key, video_info)
+        
+        return video_info
+        
     except Exception as e:
         logger.error(f"❌ 获取视频详细信息失败: {e}")
         raise Exception(f"获取视频信息失败: {str(e)}")
 
+@coalesced
 def search_channels(query: str, limit: int = 10) -> List[dict]:
     """搜索频道"""
     logger.info(f"🔍 搜索频道: {query}, 限制: {limit}")
     
     # 检查缓存
-    cache_key = f"{query}_{limit}"
-    cache_path = get_cache_path("search_channels", cache_key)
-    cached_data = load_cache(cache_path)
+    cache_key = f"search_channels:{query}_{limit}"
+    cached_data = mem_get(cache_key, CACHE_EXPIRE_SECONDS)
+    if cached_data:
+        return cached_data
+    
+    cached_data, cached_mtime = load_cache(cache_key)
     if cached_data:
         logger.info(f"📦 从缓存获取搜索结果: {len(cached_data)} 个频道")
+        mem_put_from_disk(cache_key, cached_data, cached_mtime)
         return cached_data
     
     try:
-        ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-            'extract_flat': True,
-            'playlist_items': f'1:{limit}',
-            **get_common_ydl_opts(),  # 添加通用配置
-        }
+        ydl = get_ydl('flat', playlist_items=f'1:{limit}')
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # 搜索频道
-            search_url = f'ytsearch{limit}:"{query}" channel'
-            info = ydl.extract_info(search_url, download=False)
-            
-            if not info or 'entries' not in info:
-                logger.warning(f"⚠️ 搜索无结果: {query}")
-                return []
-            
-            channels = []
-            seen_channels = set()  # 避免重复
-            
-            for entry in info['entries']:
-                if not entry or not entry.get('channel_id'):
-                    continue
-                
-                channel_id = entry['channel_id']
-                if channel_id in seen_channels:
-                    continue
-                seen_channels.add(channel_id)
-                
-                channel_info = {
-                    'channel_id': channel_id,
-                    'title': entry.get('channel', entry.get('uploader', '')),
-                    'description': (entry.get('description', '') or '')[:200],
-                    'thumbnail': '',
-                    'subscriber_count': None,
-                    'video_count': None,
-                    'webpage_url': f'https://www.youtube.com/channel/{channel_id}'
-                }
-                
-                # 处理缩略图
-                if 'thumbnails' in entry and entry['thumbnails']:
-                    channel_info['thumbnail'] = entry['thumbnails'][-1].get('url', '')
-                
-                channels.append(channel_info)
+        # 搜索频道
+        search_url = f'ytsearch{limit}:"{query}" channel'
+        info = extract_info(ydl, search_url)
+        
+        if not info or 'entries' not in info:
+            logger.warning(f"⚠️ 搜索无结果: {query}")
+            return []
+        
+        channels = []
+        seen_channels = set()  # 避免重复
+        
+        for entry in info['entries']:
+            if not entry or not entry.get('channel_id'):
+                continue
             
-            logger.info(f"✅ 搜索频道成功: {len(channels)} 个结果")
+            channel_id = entry['channel_id']
+            if channel_id in seen_channels:
+                continue
+            seen_channels.add(channel_id)
             
-            # 保存到缓存（搜索结果缓存时间较短，1小时）
-            save_cache(cache_path, channels)
+            channel_info = {
+                'channel_id': channel_id,
+                'title': entry.get('channel', entry.get('uploader', '')),
+                'description': truncate(entry.get('description'), 200),
+                'thumbnail': '',
+                'subscriber_count': None,
+                'video_count': None,
+                'webpage_url': f'https://www.youtube.com/channel/{channel_id}'
+            }
             
-            return channels
+            # 处理缩略图
+            if 'thumbnails' in entry and entry['thumbnails']:
+                channel_info['thumbnail'] = entry['thumbnails'][-1].get('url', '')
             
+            channels.append(channel_info)
+        
+        logger.info(f"✅ 搜索频道成功: {len(channels)} 个结果")
+        
+        # 保存到缓存（搜索结果缓存时间较短，1小时）
+        save_cache(cache_key, channels)
+        mem_put(cache_key, channels)
+        
+        return channels
+        
     except Exception as e:
         logger.error(f"❌ 搜索频道失败: {e}")
         raise Exception(f"搜索失败: {str(e)}")
@@ -551,6 +1013,13 @@ def search_channels(query: str, limit: int = 10) -> List[dict]:
 # 新增API端点（YouTube数据获取）
 # =============================================================================
 
+def json_response(data: Any, status: int = 200) -> Response:
+    """直接用 json_dumps 编码响应体，跳过 jsonify 的额外开销
+    
+    响应体是完整的字节串，Werkzeug 会据此设置 Content-Length，不会使用分块传输编码
+    """
+    return Response(json_dumps(data), status=status, mimetype='application/json')
+
 @app.route('/api/channel/info')
 def api_get_channel_info():
     """获取频道信息API"""
@@ -559,8 +1028,10 @@ def api_get_channel_info():
         return jsonify({"error": "Missing channel id or username"}), 400
     
     try:
-        channel_info = get_channel_info(channel_input)
+        channel_info = run_in_pool(get_channel_info, channel_input)
         return jsonify(channel_info)
+    except FuturesTimeoutError:
+        return jsonify(pool_timeout_error("channel info")), 504
     except Exception as e:
         logger.error(f"❌ 频道信息API错误: {e}")
         return jsonify({"error": str(e)}), 400
@@ -579,9 +1050,28 @@ def api_get_channel_videos():
     except ValueError:
         limit = 20
     
-    # 获取频道视频，如果失败返回空列表
-    videos = get_channel_videos(channel_input, limit)
-    return jsonify({
+    # 获取频道视频（get_channel_videos 内部出错时返回空列表）；线程池等待超时等错误直接返回错误响应
+    try:
+        videos = run_in_pool(get_channel_videos, channel_input, limit)
+    except FuturesTimeoutError:
+        return json_response({
+            **pool_timeout_error("channel videos"),
+            "videos": [],
+            "count": 0,
+            "channel_id": channel_input,
+            "status": "error"
+        }, 504)
+    except Exception as e:
+        logger.error(f"❌ 频道视频API错误: {e}")
+        return json_response({
+            "error": str(e),
+            "videos": [],
+            "count": 0,
+            "channel_id": channel_input,
+            "status": "error"
+        }, 400)
+    
+    return json_response({
         "videos": videos,
         "count": len(videos),
         "channel_id": channel_input,
@@ -594,10 +1084,14 @@ def api_get_video_info():
     video_id = request.args.get('id')
     if not video_id:
         return jsonify({"error": "Missing video id"}), 400
+    if not _VID_RE.fullmatch(video_id):
+        return jsonify({"error": "Invalid video id"}), 400
     
     try:
-        video_info = get_video_info_detailed(video_id)
+        video_info = run_in_pool(get_video_info_detailed, video_id)
         return jsonify(video_info)
+    except FuturesTimeoutError:
+        return jsonify(pool_timeout_error("video info")), 504
     except Exception as e:
         logger.error(f"❌ 视频信息API错误: {e}")
         return jsonify({"error": str(e)}), 400
@@ -609,6 +1103,11 @@ def api_search_channels():
     if not query:
         return jsonify({"error": "Missing search query"}), 400
     
+    # 过滤特殊字符并限制长度，避免注入 ytsearch 查询
+    query = _Q_RE.sub(' ', query).strip()[:SEARCH_QUERY_MAX_LENGTH]
+    if not query:
+        return jsonify({"error": "Invalid search query"}), 400
+    
     limit = request.args.get('limit', 10)
     try:
         limit = int(limit)
@@ -617,12 +1116,14 @@ def api_search_channels():
         limit = 10
     
     try:
-        channels = search_channels(query, limit)
+        channels = run_in_pool(search_channels, query, limit)
         return jsonify({
             "channels": channels,
             "count": len(channels),
             "query": query
         })
+    except FuturesTimeoutError:
+        return jsonify(pool_timeout_error("channel search")), 504
     except Exception as e:
         logger.error(f"❌ 搜索频道API错误: {e}")
         return jsonify({"error": str(e)}), 400
@@ -632,9 +1133,15 @@ def api_search_channels():
 # =============================================================================
 
 # 文件管理
+@functools.lru_cache(maxsize=4096)
+def _safe_id(video_id: str) -> str:
+    """文件名前缀（视频ID的MD5前12位），结果缓存避免重复计算"""
+    return hashlib.md5(video_id.encode()).hexdigest()[:12]
+
+@functools.lru_cache(maxsize=4096)
 def get_file_path(video_id: str, file_type: str) -> Path:
     """获取文件路径"""
-    safe_id = hashlib.md5(video_id.encode()).hexdigest()[:12]
+    safe_id = _safe_id(video_id)
     if file_type == "audio":
         return DOWNLOAD_DIR / f"{safe_id}_{video_id}.mp3"
     elif file_type == "subtitle":
@@ -644,164 +1151,270 @@ def get_file_path(video_id: str, file_type: str) -> Path:
     else:
         raise ValueError(f"Unknown file type: {file_type}")
 
-def find_actual_audio_file(video_id: str) -> Optional[Path]:
-    """查找实际存在的音频文件路径，统一逻辑避免重复代码"""
+# 查找已有音频文件时的扩展名优先级（默认 .mp3 优先）
+_AUDIO_SUFFIX_PRIORITY = ('.mp3', '', '.m4a', '.mp4', '.aac', '.webm')
+# 下载完成后依次尝试的扩展名（yt-dlp 可能输出不同格式，包括无扩展名）
+_DOWNLOADED_AUDIO_SUFFIXES = ('', '.m4a', '.mp4', '.aac', '.webm', '.mp3')
+# 字幕文件可能的扩展名，第一个是预期的 .vtt
+_SUBTITLE_SUFFIXES = ('.vtt', '.en.vtt', '.srt', '.en.srt')
+
+def find_first_nonempty(base_path: Path, suffixes) -> Optional[Path]:
+    """按顺序查找 base_path + 扩展名 中第一个存在且非空的文件，只在命中时构造 Path"""
+    base = os.fspath(base_path)
+    for suffix in suffixes:
+        candidate = f"{base}{suffix}"
+        try:
+            if os.stat(candidate).st_size > 0:
+                return Path(candidate)
+        except OSError:
+            continue
+    return None
+
+def scan_video_files(video_id: str) -> Dict[str, os.DirEntry]:
+    """一次扫描下载目录，返回该视频的所有文件，键为文件名去掉前缀后的部分（如 ".mp3"、""）"""
+    prefix = f"{_safe_id(video_id)}_{video_id}"
+    with os.scandir(DOWNLOAD_DIR) as it:
+        return {entry.name[len(prefix):]: entry for entry in it if entry.name.startswith(prefix)}
+
+def _is_nonempty_file(entry: Optional[os.DirEntry]) -> bool:
+    """目录项存在、是普通文件且非空（使用 scandir 缓存的 stat 结果）"""
+    return entry is not None and entry.is_file() and entry.stat().st_size > 0
+
+def find_actual_audio_file(video_id: str, entries: Optional[Dict[str, os.DirEntry]] = None) -> Optional[Path]:
+    """查找实际存在的音频文件路径，统一逻辑避免重复代码；entries 为已有的扫描结果"""
     # 首先检查任务中记录的实际文件路径
-    if video_id in tasks:
-        task = tasks[video_id]
+    task = tasks.get(video_id)
+    if task is not None:
         if task.audio_file and Path(task.audio_file).exists():
             actual_file = Path(task.audio_file)
             if actual_file.stat().st_size > 0:
                 return actual_file
     
-    # 检查默认路径
-    default_audio_file = get_file_path(video_id, "audio")
-    if default_audio_file.exists() and default_audio_file.stat().st_size > 0:
-        return default_audio_file
-    
-    # 尝试查找实际存在的音频文件
-    base_path = default_audio_file.with_suffix('')
-    possible_files = [
-        base_path,  # 无扩展名文件
-        Path(str(base_path) + '.m4a'),
-        Path(str(base_path) + '.mp4'),
-        Path(str(base_path) + '.aac'),
-        Path(str(base_path) + '.webm'),
-        Path(str(base_path) + '.mp3')
-    ]
-    
-    for candidate in possible_files:
-        if candidate.exists() and candidate.stat().st_size > 0:
-            return candidate
+    # 按扩展名优先级选出非空的音频文件
+    if entries is None:
+        # 绝大多数情况下文件就是预期的 .mp3，直接 stat 命中即可，未命中才扫描整个目录
+        expected = find_first_nonempty(get_file_path(video_id, "audio"), ('',))
+        if expected is not None:
+            return expected
+        entries = scan_video_files(video_id)
+    for suffix in _AUDIO_SUFFIX_PRIORITY:
+        entry = entries.get(suffix)
+        if _is_nonempty_file(entry):
+            return Path(entry.path)
     
     return None
 
-def cleanup_old_files():
-    """清理过期文件（12小时），增强保护机制避免删除仍在使用的文件"""
+# 下载目录清理提示：(上次扫描后目录的 st_mtime_ns, 剩余文件中最早的过期时间)
+# 目录没有增删改名、也还没到最早过期时间时，可以跳过整个目录扫描
+# 新下载完成或任务记录被移除（受保护文件可能变为可删除）时重置
+_download_scan_hint = (0, 0.0)
+
+def invalidate_cleanup_hint():
+    """重置清理提示，下次清理时重新扫描下载目录"""
+    global _download_scan_hint
+    _download_scan_hint = (0, 0.0)
+
+def disk_usage_ratio(path: str) -> Optional[float]:
+    """返回 path 所在磁盘的使用率（0~1），平台不支持 statvfs 时返回 None"""
+    if not hasattr(os, 'statvfs'):
+        return None
+    st = os.statvfs(path)
+    if not st.f_blocks:
+        return None
+    return 1 - st.f_bavail / st.f_blocks
+
+# 并行删除过期文件的线程数（每批删除这么多文件后检查一次低水位）
+CLEANUP_UNLINK_WORKERS = 8
+
+def _unlink_quietly(path: str) -> Optional[OSError]:
+    """删除文件，返回失败时的异常而不是抛出（供线程池 map 使用）"""
     try:
-        cutoff_time = datetime.now() - timedelta(hours=CACHE_EXPIRE_HOURS)
+        os.unlink(path)
+    except OSError as e:
+        return e
+    return None
+
+def describe_disk_cleanup() -> str:
+    """按当前水位配置描述下载文件的清理策略（用于服务信息接口）"""
+    if CLEANUP_DISK_HIGH_WATERMARK > 0:
+        return (f"磁盘使用率达到{CLEANUP_DISK_HIGH_WATERMARK:.0%}时清理超过{CACHE_EXPIRE_HOURS}小时的文件，"
+                f"降到{CLEANUP_DISK_LOW_WATERMARK:.0%}以下停止")
+    return f"定时清理过期文件（{CACHE_EXPIRE_HOURS}小时）"
+
+def cleanup_old_files(force: bool = False):
+    """清理过期文件，增强保护机制避免删除仍在使用的文件
+    
+    缓存记录和缓存文件超过12小时即清理；下载文件只在磁盘使用率达到 CLEANUP_DISK_HIGH_WATERMARK
+    时删除超过12小时的部分，降到 CLEANUP_DISK_LOW_WATERMARK 以下即停止。force=True 时忽略水位
+    """
+    global _download_scan_hint
+    try:
+        # 直接比较时间戳，避免为每个文件构造 datetime 对象
+        cutoff_time = time.time() - CACHE_EXPIRE_SECONDS
         cleaned_count = 0
         
         # 收集当前所有任务中记录的文件路径（正在使用的文件）
+        # 任务记录的路径在写入时已转换为真实路径，这里直接按字符串比较
         protected_files = set()
-        for video_id, task in tasks.items():
+        for task in tasks.values():
             if task.audio_file:
-                protected_files.add(Path(task.audio_file).resolve())
+                protected_files.add(task.audio_file)
             if task.subtitle_file:
-                protected_files.add(Path(task.subtitle_file).resolve())
-        
-        # 清理下载文件
-        for file_path in DOWNLOAD_DIR.glob("*"):
-            if file_path.is_file():
-                # 额外保护：跳过正在使用的文件
-                if file_path.resolve() in protected_files:
-                    logger.info(f"🛡️ 跳过正在使用的文件: {file_path.name}")
-                    continue
+                protected_files.add(task.subtitle_file)
+        
+        # 清理下载文件：scandir 的目录项自带文件类型和 stat 缓存，无需逐个构造 Path
+        download_root = os.path.realpath(DOWNLOAD_DIR)
+        use_watermark = not force and CLEANUP_DISK_HIGH_WATERMARK > 0
+        usage = disk_usage_ratio(download_root) if use_watermark else None
+        hint_mtime_ns, next_expiry = _download_scan_hint
+        if usage is not None and usage < CLEANUP_DISK_HIGH_WATERMARK:
+            logger.debug("⏭️ 磁盘使用率 %.0f%% 低于高水位，跳过下载目录清理", usage * 100)
+        elif os.stat(download_root).st_mtime_ns == hint_mtime_ns and time.time() < next_expiry:
+            logger.debug("⏭️ 下载目录没有到期文件，跳过扫描")
+        else:
+            earliest_mtime = float('inf')
+            stale_files = []
+            with os.scandir(download_root) as it:
+                for entry in it:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
                     
-                file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                if file_time < cutoff_time:
-                    try:
-                        file_path.unlink()
-                        cleaned_count += 1
-                        logger.info(f"🗑️ 清理过期下载文件: {file_path.name}")
-                    except Exception as e:
-                        logger.error(f"❌ 删除文件失败 {file_path}: {e}")
+                    # 额外保护：跳过正在使用的文件
+                    if entry.path in protected_files:
+                        logger.info("🛡️ 跳过正在使用的文件: %s", entry.name)
+                        continue
+                    
+                    file_mtime = entry.stat(follow_symlinks=False).st_mtime
+                    if file_mtime < cutoff_time:
+                        stale_files.append((file_mtime, entry.path, entry.name))
+                    else:
+                        earliest_mtime = min(earliest_mtime, file_mtime)
+            
+            # 最旧的文件优先；每批文件并行 unlink，批次之间检查是否已降到低水位
+            below_low_watermark = False
+            if stale_files:
+                stale_files.sort()
+                with ThreadPoolExecutor(max_workers=CLEANUP_UNLINK_WORKERS, thread_name_prefix="unlink") as pool:
+                    for start in range(0, len(stale_files), CLEANUP_UNLINK_WORKERS):
+                        # 已降到低水位以下，剩余过期文件留到下次磁盘紧张时再删
+                        if start and usage is not None and disk_usage_ratio(download_root) < CLEANUP_DISK_LOW_WATERMARK:
+                            below_low_watermark = True
+                            break
+                        batch = stale_files[start:start + CLEANUP_UNLINK_WORKERS]
+                        errors = pool.map(_unlink_quietly, [path for _, path, _ in batch])
+                        for (file_mtime, path, name), error in zip(batch, errors):
+                            if error is None:
+                                cleaned_count += 1
+                                logger.info("🗑️ 清理过期下载文件: %s", name)
+                            else:
+                                logger.error("❌ 删除文件失败 %s: %s", path, error)
+                                earliest_mtime = min(earliest_mtime, file_mtime)
+            
+            # 提前停止时没有看到全部文件，不能据此记录最早到期时间
+            if below_low_watermark:
+                _download_scan_hint = (0, 0.0)
+            else:
+                _download_scan_hint = (os.stat(download_root).st_mtime_ns, earliest_mtime + CACHE_EXPIRE_SECONDS)
+        
+        # 清理过期的缓存数据库记录
+        purged_entries = purge_expired_cache()
+        if purged_entries > 0:
+            logger.info("🗑️ 清理过期缓存记录: %s 条", purged_entries)
         
-        # 清理缓存文件（保持原有逻辑）
-        for file_path in CACHE_DIR.glob("*"):
-            if file_path.is_file():
-                file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                if file_time < cutoff_time:
+        # 清理旧版本遗留的缓存文件（跳过缓存数据库本身）
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False) or entry.name.startswith(CACHE_DB.name):
+                    continue
+                if entry.stat(follow_symlinks=False).st_mtime < cutoff_time:
                     try:
-                        file_path.unlink()
+                        os.unlink(entry.path)
                         cleaned_count += 1
-                        logger.info(f"🗑️ 清理过期缓存文件: {file_path.name}")
+                        logger.info("🗑️ 清理过期缓存文件: %s", entry.name)
                     except Exception as e:
-                        logger.error(f"❌ 删除缓存文件失败 {file_path}: {e}")
+                        logger.error("❌ 删除缓存文件失败 %s: %s", entry.path, e)
         
         # 清理旧的任务记录（避免内存积累）
         cleaned_tasks = cleanup_old_tasks()
         
         if cleaned_count > 0 or cleaned_tasks > 0:
-            logger.info(f"🧹 清理完成: 删除了 {cleaned_count} 个过期文件，{cleaned_tasks} 个旧任务记录")
-            logger.info(f"🛡️ 保护了 {len(protected_files)} 个正在使用的文件")
+            logger.info("🧹 清理完成: 删除了 %s 个过期文件，%s 个旧任务记录", cleaned_count, cleaned_tasks)
+            logger.info("🛡️ 保护了 %s 个正在使用的文件", len(protected_files))
         
     except Exception as e:
-        logger.error(f"❌ 文件清理失败: {e}")
+        logger.error("❌ 文件清理失败: %s", e)
 
 def cleanup_old_tasks():
     """清理旧的任务记录，避免内存积累"""
     try:
+        # 截止时间只计算一次，循环内直接比较
         cutoff_time = datetime.now() - timedelta(hours=CACHE_EXPIRE_HOURS)
         tasks_to_remove = []
         
-        for video_id, task in tasks.items():
+        for task in tasks.values():
             # 清理超过12小时的已完成、失败或取消的任务
-            if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
-                if task.created_at and datetime.now() - task.created_at > timedelta(hours=CACHE_EXPIRE_HOURS):
-                    tasks_to_remove.append(video_id)
-                elif task.completed_at and datetime.now() - task.completed_at > timedelta(hours=CACHE_EXPIRE_HOURS):
-                    tasks_to_remove.append(video_id)
-        
-        # 删除旧任务记录
-        for video_id in tasks_to_remove:
-            try:
-                del tasks[video_id]
-                logger.info(f"🗑️ 清理旧任务记录: {video_id}")
-            except KeyError:
-                pass  # 任务已被其他地方删除
+            if task.status in FINISHED_STATUSES:
+                if task.created_at and task.created_at < cutoff_time:
+                    tasks_to_remove.append(task)
+                elif task.completed_at and task.completed_at < cutoff_time:
+                    tasks_to_remove.append(task)
+        
+        # 删除旧任务记录（跳过已被删除或替换为新任务的记录）
+        removed_count = 0
+        for task in tasks_to_remove:
+            if tasks.remove(task.video_id, expected=task):
+                removed_count += 1
+                logger.info("🗑️ 清理旧任务记录: %s", task.video_id)
+        
+        # 这些任务的文件不再受保护，下次清理需要重新扫描
+        if removed_count > 0:
+            invalidate_cleanup_hint()
         
-        return len(tasks_to_remove)
+        return removed_count
         
     except Exception as e:
-        logger.error(f"❌ 任务清理失败: {e}")
+        logger.error("❌ 任务清理失败: %s", e)
         return 0
 
-def check_existing_files(video_id: str) -> Dict[str, bool]:
-    """检查文件是否已存在且有效（不检查过期时间）"""
+def check_existing_files(video_id: str) -> Dict[str, Optional[Path]]:
+    """检查文件是否已存在且有效（不检查过期时间），返回找到的文件路径，不存在时为 None"""
+    # 字幕和信息文件只认预期路径，直接 stat；音频只在预期的 .mp3 不存在时才扫描目录
     result = {
-        "audio": False,
-        "subtitle": False,
-        "info": False
+        "audio": find_actual_audio_file(video_id),
+        "subtitle": find_first_nonempty(get_file_path(video_id, "subtitle"), ('',)),
+        "info": find_first_nonempty(get_file_path(video_id, "info"), ('',))
     }
     
-    for file_type in result.keys():
-        file_path = get_file_path(video_id, file_type)
-        
-        if file_type == "audio":
-            actual_audio_file = find_actual_audio_file(video_id)
-            if actual_audio_file:
-                result[file_type] = True
-        else:
-            # 非音频文件使用原有逻辑
-            if file_path.exists() and file_path.stat().st_size > 0:
-                result[file_type] = True
-    
-    logger.info(f"🎯 文件检查结果 {video_id}: audio={result['audio']}, subtitle={result['subtitle']}")
+    logger.info(f"🎯 文件检查结果 {video_id}: audio={result['audio'] is not None}, subtitle={result['subtitle'] is not None}")
     return result
 
 def get_video_info(video_id: str) -> Optional[Dict]:
     """获取视频信息（从缓存或网络）"""
     info_file = get_file_path(video_id, "info")
     
-    # 尝试从缓存读取
-    if info_file.exists():
-        try:
-            with open(info_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.warning(f"⚠️ 读取缓存信息失败: {e}")
+    # 尝试从缓存读取（二进制读取后直接解析，省去文本解码）
+    try:
+        return json_loads(info_file.read_bytes())
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"⚠️ 读取缓存信息失败: {e}")
     
     # 从网络获取（使用新的详细信息获取函数）
     try:
         video_info = get_video_info_detailed(video_id)
         
-        # 保存到缓存
+        # 保存到缓存：先写临时文件再原子替换，避免中途崩溃留下不完整的文件
+        tmp_file = info_file.with_name(f"{info_file.name}.{threading.get_ident()}.tmp")
         try:
-            with open(info_file, 'w', encoding='utf-8') as f:
-                json.dump(video_info, f, ensure_ascii=False, indent=2)
+            tmp_file.write_bytes(json_dumps(video_info))
+            os.replace(tmp_file, info_file)
         except Exception as e:
             logger.warning(f"⚠️ 保存视频信息缓存失败: {e}")
+            try:
+                tmp_file.unlink()
+            except OSError:
+                pass
         
         return video_info
         
@@ -809,98 +1422,124 @@ def get_video_info(video_id: str) -> Optional[Dict]:
         logger.error(f"❌ 获取视频信息失败: {e}")
         return None
 
+# 下载用的 yt-dlp 配置（输出路径和进度回调随任务变化，不在这里设置）
+_DOWNLOAD_YDL_OPTS = MappingProxyType({
+    # 使用更兼容的格式选择器，避免 SABR 流问题
+    'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
+    'writesubtitles': True,
+    'writeautomaticsub': True,
+    'subtitleslangs': ['en'],
+    'subtitlesformat': 'vtt',
+    'writeinfojson': True,
+    'extract_audio': True,
+    'audio_format': 'mp3',
+    'audio_quality': '128k',
+    'prefer_ffmpeg': True,
+    'noplaylist': True,
+    'ignoreerrors': False,
+    'no_warnings': True,
+    'quiet': True,
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'mp3',
+        'preferredquality': '128',
+    }],
+})
+
+# 每个下载线程复用一个 yt-dlp 实例，避免每个任务重新初始化 extractor 和后处理器
+# 进度回调在初始化时注册，通过线程本地变量转发给当前任务
+_download_local = threading.local()
+
+def _download_progress_hook(d):
+    """把 yt-dlp 的进度转发给当前线程正在处理的任务"""
+    hook = getattr(_download_local, 'progress_hook', None)
+    if hook is not None:
+        hook(d)
+
+def get_download_ydl(outtmpl: str) -> yt_dlp.YoutubeDL:
+    """获取当前线程的下载实例，并设置本次任务的输出路径模板"""
+    ydl = getattr(_download_local, 'ydl', None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL({
+            **_DOWNLOAD_YDL_OPTS,
+            'progress_hooks': [_download_progress_hook],
+            **_COMMON_YDL_OPTS,
+        })
+        _download_local.ydl = ydl
+    
+    # yt-dlp 每次下载时读取 outtmpl，可以直接替换
+    ydl.params['outtmpl']['default'] = outtmpl
+    return ydl
+
+def discard_download_ydl():
+    """下载出错后丢弃当前线程的实例，下一个任务重新创建"""
+    ydl = getattr(_download_local, 'ydl', None)
+    _download_local.ydl = None
+    if ydl is not None:
+        try:
+            ydl.close()
+        except Exception:
+            pass
+
 def download_files(task: DownloadTask):
     """下载音频和字幕文件"""
     try:
         logger.info(f"🎵 开始下载任务: {task.video_id}")
-        task.status = TaskStatus.DOWNLOADING
-        task.progress = 0.0
-        task.message = "准备下载..."
+        # 排队期间可能已被取消
+        if not tasks.transition(task, TaskStatus.DOWNLOADING, allowed_from=(TaskStatus.PENDING,),
+                                progress=0.0, message="准备下载..."):
+            logger.info(f"⚠️ 任务已取消: {task.video_id}")
+            return
         
         # 获取视频信息
         task.video_info = get_video_info(task.video_id)
         if not task.video_info:
             raise Exception("无法获取视频信息")
         
-        task.progress = 0.1
-        task.message = "获取下载链接..."
+        task.update(progress=0.1, message="获取下载链接...")
         
         audio_file = get_file_path(task.video_id, "audio")
         subtitle_file = get_file_path(task.video_id, "subtitle")
         
-        # 创建yt-dlp选项
+        # 下载进度回调
         def progress_hook(d):
             if d['status'] == 'downloading':
-                if 'total_bytes' in d and d['total_bytes']:
-                    task.progress = 0.1 + 0.8 * (d['downloaded_bytes'] / d['total_bytes'])
-                elif 'total_bytes_estimate' in d and d['total_bytes_estimate']:
-                    task.progress = 0.1 + 0.8 * (d['downloaded_bytes'] / d['total_bytes_estimate'])
-                else:
-                    # 无法获取总大小时的进度估算
-                    task.progress = min(0.9, task.progress + 0.01)
-                
-                task.message = f"下载中... {d.get('_percent_str', 'N/A')}"
+                with task._lock:
+                    if 'total_bytes' in d and d['total_bytes']:
+                        task.progress = 0.1 + 0.8 * (d['downloaded_bytes'] / d['total_bytes'])
+                    elif 'total_bytes_estimate' in d and d['total_bytes_estimate']:
+                        task.progress = 0.1 + 0.8 * (d['downloaded_bytes'] / d['total_bytes_estimate'])
+                    else:
+                        # 无法获取总大小时的进度估算
+                        task.progress = min(0.9, task.progress + 0.01)
+                    
+                    task.message = f"下载中... {d.get('_percent_str', 'N/A')}"
                 logger.info(f"📊 {task.video_id}: {task.message}")
                 
             elif d['status'] == 'finished':
-                task.progress = 0.9
-                task.message = "下载完成，处理中..."
+                task.update(progress=0.9, message="下载完成，处理中...")
                 logger.info(f"✅ {task.video_id}: 文件下载完成")
 
-        ydl_opts = {
-            # 使用更兼容的格式选择器，避免 SABR 流问题
-            'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
-            'outtmpl': str(audio_file.with_suffix('.%(ext)s')),
-            'writesubtitles': True,
-            'writeautomaticsub': True,
-            'subtitleslangs': ['en'],
-            'subtitlesformat': 'vtt',
-            'writeinfojson': True,
-            'extract_audio': True,
-            'audio_format': 'mp3',
-            'audio_quality': '128k',
-            'prefer_ffmpeg': True,
-            'noplaylist': True,
-            'ignoreerrors': False,
-            'no_warnings': True,
-            'quiet': True,
-            'progress_hooks': [lambda d: progress_hook(d)],
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '128',
-            }],
-            **get_common_ydl_opts(),
-        }
-        
         # 检查任务是否被取消
         if task.status == TaskStatus.CANCELLED:
             logger.info(f"⚠️ 任务已取消: {task.video_id}")
             return
         
-        # 执行下载
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # 执行下载（复用当前线程的 yt-dlp 实例）
+        ydl = get_download_ydl(str(audio_file.with_suffix('.%(ext)s')))
+        _download_local.progress_hook = progress_hook
+        try:
             ydl.download([f'https://www.youtube.com/watch?v={task.video_id}'])
+        except Exception:
+            discard_download_ydl()
+            raise
+        finally:
+            _download_local.progress_hook = None
         
         # 验证文件 - 检查实际下载的文件
         # yt-dlp可能会下载不同的格式，我们需要查找实际的文件
         base_path = audio_file.with_suffix('')  # 无扩展名的基础路径
-        actual_audio_file = None
-        
-        # 常见的音频文件扩展名，包括无扩展名
-        possible_files = [
-            base_path,  # 无扩展名文件
-            Path(str(base_path) + '.m4a'),
-            Path(str(base_path) + '.mp4'),
-            Path(str(base_path) + '.aac'),
-            Path(str(base_path) + '.webm'),
-            Path(str(base_path) + '.mp3')
-        ]
-        
-        for candidate in possible_files:
-            if candidate.exists() and candidate.stat().st_size > 0:
-                actual_audio_file = candidate
-                break
+        actual_audio_file = find_first_nonempty(base_path, _DOWNLOADED_AUDIO_SUFFIXES)
         
         if not actual_audio_file:
             raise Exception("音频文件下载失败或为空")
@@ -910,8 +1549,8 @@ def download_files(task: DownloadTask):
         
         if actual_audio_file != target_audio_file:
             try:
-                # 重命名为带扩展名的文件
-                shutil.move(str(actual_audio_file), str(target_audio_file))
+                # 重命名为带扩展名的文件（同一目录，os.replace 一次系统调用且原子覆盖）
+                os.replace(actual_audio_file, target_audio_file)
                 logger.info(f"✅ 音频文件重命名: {actual_audio_file.name} -> {target_audio_file.name}")
                 actual_audio_file = target_audio_file
             except Exception as e:
@@ -919,30 +1558,19 @@ def download_files(task: DownloadTask):
                 # 如果重命名失败，使用实际文件
                 pass
         
-        task.audio_file = str(actual_audio_file)
+        task.audio_file = os.path.realpath(actual_audio_file)
         logger.info(f"🎵 音频文件下载成功: {actual_audio_file.name} ({actual_audio_file.stat().st_size / 1024 / 1024:.1f} MB)")
         
         # 检查字幕文件（可能不存在）
         # 字幕文件也可能有不同的扩展名
         subtitle_base = subtitle_file.with_suffix('')  # 无扩展名的基础路径
-        subtitle_candidates = [
-            subtitle_file,  # .vtt
-            Path(str(subtitle_base) + '.en.vtt'),  # .en.vtt
-            Path(str(subtitle_base) + '.srt'),  # 备用.srt
-            Path(str(subtitle_base) + '.en.srt'),  # 备用.en.srt
-        ]
-        
-        actual_subtitle_file = None
-        for candidate in subtitle_candidates:
-            if candidate.exists() and candidate.stat().st_size > 0:
-                actual_subtitle_file = candidate
-                break
+        actual_subtitle_file = find_first_nonempty(subtitle_base, _SUBTITLE_SUFFIXES)
         
         if actual_subtitle_file:
             # 如果找到的字幕文件名与预期不同，重命名为预期的.vtt格式
             if actual_subtitle_file != subtitle_file:
                 try:
-                    shutil.move(str(actual_subtitle_file), str(subtitle_file))
+                    os.replace(actual_subtitle_file, subtitle_file)
                     logger.info(f"✅ 字幕文件重命名: {actual_subtitle_file.name} -> {subtitle_file.name}")
                     # 更新为重命名后的文件路径
                     actual_subtitle_file = subtitle_file
@@ -950,30 +1578,57 @@ def download_files(task: DownloadTask):
                     logger.warning(f"⚠️ 字幕文件重命名失败: {e}")
             
             logger.info(f"✅ 字幕文件验证通过: {actual_subtitle_file.name}")
-            task.subtitle_file = str(actual_subtitle_file)
+            task.subtitle_file = os.path.realpath(actual_subtitle_file)
             logger.info(f"📝 字幕文件下载成功: {actual_subtitle_file.name} ({actual_subtitle_file.stat().st_size / 1024:.1f} KB)")
         else:
             logger.info(f"⚠️ 未找到字幕文件")
         
-        # 完成
-        task.status = TaskStatus.COMPLETED
-        task.progress = 1.0
-        task.message = "下载完成"
-        task.completed_at = datetime.now()
+        # 新文件的 mtime 可能来自视频发布时间（yt-dlp 默认行为），重置清理提示
+        invalidate_cleanup_hint()
+        
+        # 完成（下载期间被取消的任务保持取消状态）
+        if not tasks.transition(
+            task,
+            TaskStatus.COMPLETED,
+            allowed_from=(TaskStatus.DOWNLOADING,),
+            progress=1.0,
+            message="下载完成",
+            completed_at=datetime.now()
+        ):
+            logger.info(f"⚠️ 任务已取消: {task.video_id}")
+            return
         
         logger.info(f"✅ 下载任务完成: {task.video_id}")
         
     except Exception as e:
-        if task.status != TaskStatus.CANCELLED:
-            task.status = TaskStatus.FAILED
-            task.error = str(e)
-            task.message = f"下载失败: {str(e)}"
+        failed = tasks.transition(
+            task,
+            TaskStatus.FAILED,
+            allowed_from=ACTIVE_STATUSES,
+            error=str(e),
+            message=f"下载失败: {str(e)}"
+        )
+        if failed:
             logger.error(f"❌ 下载失败 {task.video_id}: {e}")
+
+def _on_download_done(task: DownloadTask, future: Future):
+    """下载结束后的回调：记录未捕获的异常，并释放任务对 Future 的引用"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"❌ 下载线程异常退出 {task.video_id}: {future.exception()}")
+    
+    with task._lock:
+        if task.future is future:
+            task.future = None
+
+def submit_download(task: DownloadTask):
+    """把下载任务提交到下载线程池（等待期间已取消的任务直接跳过）"""
+    with task._lock:
+        if task.status == TaskStatus.CANCELLED:
+            return
+        future = task.future = WTP.submit(download_files, task)
     
-    finally:
-        # 清理线程引用
-        if task.video_id in download_threads:
-            del download_threads[task.video_id]
+    # 任务可能已经结束，回调会立即在当前线程执行，因此在锁外注册
+    future.add_done_callback(functools.partial(_on_download_done, task))
 
 # API 端点
 
@@ -986,21 +1641,25 @@ def start_download():
     
     logger.info(f"🚀 收到下载请求: {video_id}")
     
-    # 首先检查文件是否已存在且有效
+    # 首先检查文件是否已存在且有效（检查结果直接给出实际文件路径，无需再次查找）
     existing_files = check_existing_files(video_id)
     if existing_files["audio"]:
         logger.info(f"✅ 音频文件已存在，直接返回: {video_id}")
         
         # 🔧 修复: 使用统一的查找逻辑获取实际文件路径
-        actual_audio_file = find_actual_audio_file(video_id)
-        actual_audio_file_path = str(actual_audio_file) if actual_audio_file else None
+        actual_audio_file_path = os.path.realpath(existing_files["audio"])
         
         # 查找字幕文件
         actual_subtitle_file_path = None
         if existing_files["subtitle"]:
-            subtitle_file = get_file_path(video_id, "subtitle")
-            if subtitle_file.exists():
-                actual_subtitle_file_path = str(subtitle_file)
+            actual_subtitle_file_path = os.path.realpath(existing_files["subtitle"])
+        
+        # 已完成的任务中已有视频信息时直接复用，避免每次重复请求都读取解析信息文件
+        previous_task = tasks.get(video_id)
+        if previous_task is not None and previous_task.status == TaskStatus.COMPLETED and previous_task.video_info:
+            video_info = previous_task.video_info
+        else:
+            video_info = get_video_info(video_id)
         
         # 创建或更新已完成的任务记录
         task = DownloadTask(
@@ -1011,9 +1670,9 @@ def start_download():
             message="文件已存在",
             audio_file=actual_audio_file_path,  # 使用实际找到的文件路径
             subtitle_file=actual_subtitle_file_path,  # 使用实际找到的字幕路径
-            video_info=get_video_info(video_id)
+            video_info=video_info
         )
-        tasks[video_id] = task
+        tasks.put(task)
         return jsonify({
             "task_id": task.task_id,
             "status": task.status.value,
@@ -1021,40 +1680,40 @@ def start_download():
             "files_ready": True
         })
     
-    # 检查是否已有正在进行的任务
-    if video_id in tasks:
-        existing_task = tasks[video_id]
-        
-        # 如果任务正在进行中，返回任务信息
-        if existing_task.status in [TaskStatus.PENDING, TaskStatus.DOWNLOADING]:
-            logger.info(f"⚠️ 任务正在进行中: {video_id}")
-            return jsonify({
-                "task_id": existing_task.task_id,
-                "status": existing_task.status.value,
-                "message": "任务已在进行中"
-            })
-        
-        # 清理失败或取消的任务记录
-        elif existing_task.status in [TaskStatus.FAILED, TaskStatus.CANCELLED]:
-            logger.info(f"🔄 清理失败/取消的任务，重新开始: {video_id}")
-            del tasks[video_id]
-    
-    # 创建新的下载任务
-    logger.info(f"🎬 文件不存在，开始新的下载任务: {video_id}")
-    task = DownloadTask(
-        task_id=str(uuid.uuid4()),
-        video_id=video_id,
-        status=TaskStatus.PENDING,
-        progress=0.0,
-        message="任务已创建"
-    )
-    
-    tasks[video_id] = task
+    # 检查和创建任务在同一把锁内完成，避免并发请求重复创建下载任务
+    with tasks.lock_for(video_id):
+        # 检查是否已有正在进行的任务
+        existing_task = tasks.get(video_id)
+        if existing_task is not None:
+            # 如果任务正在进行中，返回任务信息
+            if existing_task.status in ACTIVE_STATUSES:
+                logger.info(f"⚠️ 任务正在进行中: {video_id}")
+                return jsonify({
+                    "task_id": existing_task.task_id,
+                    "status": existing_task.status.value,
+                    "message": "任务已在进行中"
+                })
+            
+            # 清理失败或取消的任务记录
+            elif existing_task.status in (TaskStatus.FAILED, TaskStatus.CANCELLED):
+                logger.info(f"🔄 清理失败/取消的任务，重新开始: {video_id}")
+                tasks.remove(video_id)
+                invalidate_cleanup_hint()
+        
+        # 创建新的下载任务
+        logger.info(f"🎬 文件不存在，开始新的下载任务: {video_id}")
+        task = DownloadTask(
+            task_id=str(uuid.uuid4()),
+            video_id=video_id,
+            status=TaskStatus.PENDING,
+            progress=0.0,
+            message="任务已创建"
+        )
+        
+        tasks.put(task)
     
-    # 启动下载线程
-    thread = threading.Thread(target=download_files, args=(task,))
-    download_threads[video_id] = thread
-    thread.start()
+    # 随机等待后再提交到下载线程池
+    scheduler.call_later(random.uniform(PRE_DOWNLOAD_SLEEP_MIN, PRE_DOWNLOAD_SLEEP_MAX), submit_download, task)
     
     logger.info(f"🎬 下载任务已启动: {video_id}")
     
@@ -1071,10 +1730,21 @@ def get_status():
     if not video_id:
         return jsonify({"error": "Missing video id"}), 400
     
-    if video_id not in tasks:
+    task = tasks.get(video_id)
+    if task is None:
         return jsonify({"error": "Task not found"}), 404
     
-    task = tasks[video_id]
+    # 读取快照，避免与下载线程的更新交错
+    task = task.snapshot()
+    
+    # 轮询时状态和进度（按 1% 取整）都没变化则返回 304，省去构造和序列化响应
+    # 进度消息等细节可能略有差异，因此使用弱 ETag
+    etag = f"{task.task_id}-{task.status.value}-{int(task.progress * 100)}"
+    if request.if_none_match.contains_weak(etag):
+        not_modified = Response(status=304)
+        not_modified.set_etag(etag, weak=True)
+        not_modified.headers['Cache-Control'] = 'no-cache'
+        return not_modified
     
     response = {
         "task_id": task.task_id,
@@ -1097,7 +1767,23 @@ def get_status():
     if task.status == TaskStatus.FAILED and task.error:
         response["error"] = task.error
     
-    return jsonify(response)
+    response = jsonify(response)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# mimetypes 无法识别时使用的扩展名映射
+_MIME_MAPPING = {
+    '.m4a': 'audio/mp4',
+    '.mp4': 'audio/mp4',
+    '.mp3': 'audio/mpeg',
+    '.aac': 'audio/aac',
+    '.webm': 'audio/webm',
+    '.ogg': 'audio/ogg',
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '': 'audio/mp4'  # 无扩展名默认为audio/mp4
+}
 
 def get_file_mime_type(file_path: Path) -> str:
     """根据文件扩展名和内容检测MIME类型"""
@@ -1108,20 +1794,42 @@ def get_file_mime_type(file_path: Path) -> str:
         return mime_type
     
     # 根据扩展名手动映射
-    ext = file_path.suffix.lower()
-    mime_mapping = {
-        '.m4a': 'audio/mp4',
-        '.mp4': 'audio/mp4',
-        '.mp3': 'audio/mpeg',
-        '.aac': 'audio/aac',
-        '.webm': 'audio/webm',
-        '.ogg': 'audio/ogg',
-        '.wav': 'audio/wav',
-        '.flac': 'audio/flac',
-        '': 'audio/mp4'  # 无扩展名默认为audio/mp4
-    }
+    return _MIME_MAPPING.get(file_path.suffix.lower(), 'audio/mp4')  # 默认使用audio/mp4
+
+def send_download_file(file_path: Path, mimetype: str) -> Response:
+    """发送下载目录中的文件；配置了 STATIC_OFFLOAD 时只返回响应头，由前端服务器发送文件并处理 Range"""
+    if STATIC_OFFLOAD == 'nginx':
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX + urllib.parse.quote(file_path.name)
+    elif STATIC_OFFLOAD == 'sendfile':
+        response = Response(mimetype=mimetype)
+        response.headers['X-Sendfile'] = os.path.realpath(file_path)
+    else:
+        # ETag 由一次 stat 的结果直接生成；客户端缓存仍有效时直接返回 304，不再打开文件
+        file_stat = os.stat(file_path)
+        etag = f"{file_stat.st_ino:x}-{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'public, max-age=3600'
+            return response
+        
+        # 支持Range请求（需要 Flask/Werkzeug 2.0+，返回 206 Partial Content）
+        # send_file 按应用目录解析相对路径，而下载目录相对于当前工作目录，因此传入绝对路径
+        response = send_file(
+            os.path.abspath(file_path),
+            mimetype=mimetype,
+            as_attachment=False,
+            conditional=True,  # 启用Range支持
+            etag=etag,
+            last_modified=file_stat.st_mtime,
+            max_age=3600
+        )
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
     
-    return mime_mapping.get(ext, 'audio/mp4')  # 默认使用audio/mp4
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
 
 @app.route('/files/audio')
 def serve_audio():
@@ -1141,13 +1849,7 @@ def serve_audio():
     mime_type = get_file_mime_type(audio_file)
     logger.info(f"🎵 提供音频文件: {video_id}, 文件: {audio_file.name}, MIME: {mime_type}")
     
-    # 支持Range请求
-    return send_file(
-        audio_file,
-        mimetype=mime_type,
-        as_attachment=False,
-        conditional=True  # 启用Range支持
-    )
+    return send_download_file(audio_file, mime_type)
 
 @app.route('/files/subtitle')
 def serve_subtitle():
@@ -1162,11 +1864,7 @@ def serve_subtitle():
     
     logger.info(f"📝 提供字幕文件: {video_id}")
     
-    return send_file(
-        subtitle_file,
-        mimetype="text/plain",
-        as_attachment=False
-    )
+    return send_download_file(subtitle_file, "text/plain")
 
 @app.route('/info')
 def get_video_info_api():
@@ -1188,21 +1886,24 @@ def cancel_download():
     if not video_id:
         return jsonify({"error": "Missing video id"}), 400
     
-    if video_id not in tasks:
+    task = tasks.get(video_id)
+    if task is None:
         return jsonify({"error": "Task not found"}), 404
     
-    task = tasks[video_id]
+    cancellable = tasks.transition(
+        task,
+        TaskStatus.CANCELLED,
+        allowed_from=ACTIVE_STATUSES,
+        message="任务已取消"
+    )
     
-    if task.status in [TaskStatus.PENDING, TaskStatus.DOWNLOADING]:
-        task.status = TaskStatus.CANCELLED
-        task.message = "任务已取消"
-        
-        # 等待线程结束（非阻塞）
-        if video_id in download_threads:
-            thread = download_threads[video_id]
-            if thread.is_alive():
-                # 给线程一些时间自行结束
-                thread.join(timeout=2.0)
+    if cancellable:
+        # 下载结束时回调会清空 task.future，因此在锁内只读取一次
+        with task._lock:
+            future = task.future
+        # 尚未开始的任务直接从线程池队列中移除，正在运行的给一些时间自行结束
+        if future is not None and not future.cancel():
+            wait([future], timeout=2.0)
         
         logger.info(f"⚠️ 下载任务已取消: {video_id}")
         
@@ -1252,22 +1953,34 @@ def cookies_diagnose():
     
     if COOKIES_FILE.exists():
         try:
+            # 逐行读取，一次遍历完成所有统计，不把整个文件读入内存
+            file_size = 0
+            line_count = 0
+            is_netscape_format = None
+            has_youtube_cookies = False
+            valid_cookie_count = 0
             with open(COOKIES_FILE, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.strip().split('\n')
-                diagnosis["file_size"] = len(content)
-                diagnosis["line_count"] = len(lines)
-                diagnosis["is_netscape_format"] = lines[0].startswith('#') if lines else False
-                diagnosis["has_youtube_cookies"] = any('youtube' in line.lower() for line in lines)
-                
-                # 检查是否有有效的 cookies
-                valid_cookies = [l for l in lines if l.strip() and not l.startswith('#')]
-                diagnosis["valid_cookie_count"] = len(valid_cookies)
-                
-                if diagnosis["valid_cookie_count"] > 0:
-                    diagnosis["status"] = "✅ Cookies 文件看起来有效"
-                else:
-                    diagnosis["status"] = "❌ Cookies 文件为空或格式不正确"
+                for line in f:
+                    file_size += len(line)
+                    line_count += 1
+                    if is_netscape_format is None:
+                        is_netscape_format = line.startswith('#')
+                    if not has_youtube_cookies and 'youtube' in line.lower():
+                        has_youtube_cookies = True
+                    # 检查是否有有效的 cookies
+                    if line.strip() and not line.startswith('#'):
+                        valid_cookie_count += 1
+            
+            diagnosis["file_size"] = file_size
+            diagnosis["line_count"] = line_count
+            diagnosis["is_netscape_format"] = bool(is_netscape_format)
+            diagnosis["has_youtube_cookies"] = has_youtube_cookies
+            diagnosis["valid_cookie_count"] = valid_cookie_count
+            
+            if valid_cookie_count > 0:
+                diagnosis["status"] = "✅ Cookies 文件看起来有效"
+            else:
+                diagnosis["status"] = "❌ Cookies 文件为空或格式不正确"
         except Exception as e:
             diagnosis["status"] = f"❌ 无法读取 Cookies 文件: {e}"
     else:
@@ -1292,14 +2005,14 @@ def test_youtube_connection(video_id):
         }
         
         ydl_opts = {
-            **get_common_ydl_opts(),
+            **_COMMON_YDL_OPTS,
             'quiet': True,
             'no_warnings': True,
             'extract_flat': True,
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+            info = extract_info(ydl, f'https://www.youtube.com/watch?v={video_id}')
             
         test_result["tests"]["basic_connection"] = {
             "status": "✅ 成功",
@@ -1364,23 +2077,22 @@ def test_youtube_connection(video_id):
 @app.route('/health')
 def health_check():
     """健康检查"""
-    active_tasks = sum(1 for task in tasks.values() 
-                      if task.status in [TaskStatus.PENDING, TaskStatus.DOWNLOADING])
-    
-    completed_tasks = sum(1 for task in tasks.values() 
-                         if task.status == TaskStatus.COMPLETED)
-    
-    failed_tasks = sum(1 for task in tasks.values() 
-                      if task.status == TaskStatus.FAILED)
+    # 各状态数量由任务表在状态变化时维护，无需遍历任务
+    counts = tasks.status_counts()
+    active_tasks = sum(counts[status] for status in ACTIVE_STATUSES)
+    completed_tasks = counts[TaskStatus.COMPLETED]
+    failed_tasks = counts[TaskStatus.FAILED]
     
     # 统计文件信息
-    download_files_count = len(list(DOWNLOAD_DIR.glob("*")))
-    cache_files_count = len(list(CACHE_DIR.glob("*")))
+    with os.scandir(DOWNLOAD_DIR) as it:
+        download_files_count = sum(1 for _ in it)
+    cache_entries_count = count_cache_entries()
     
     return jsonify({
         "status": "healthy",
         "service": "YouTube Audio Download Server with yt-dlp Data API",
         "version": "3.0.0",
+        "yt_dlp_version": YTDLP_VERSION,
         "tasks": {
             "active": active_tasks,
             "completed": completed_tasks,
@@ -1389,7 +2101,7 @@ def health_check():
         },
         "files": {
             "download_files": download_files_count,
-            "cache_files": cache_files_count
+            "cache_entries": cache_entries_count
         },
         "directories": {
             "download_dir": str(DOWNLOAD_DIR.absolute()),
@@ -1400,7 +2112,7 @@ def health_check():
             "intelligent_file_reuse": "智能文件复用 - 已下载文件永久有效，无需重复下载",
             "smart_task_management": "智能任务管理，避免重复任务",
             "memory_cleanup": "定时清理过期任务记录（12小时）",
-            "disk_cleanup": "定时清理过期文件（12小时）"
+            "disk_cleanup": describe_disk_cleanup()
         }
     })
 
@@ -1414,7 +2126,7 @@ def index():
         "features": [
             "完整下载mp3音频和vtt字幕",
             "支持断点续传",
-            "自动缓存管理(12小时)",
+            f"自动缓存管理(信息缓存12小时，下载文件{describe_disk_cleanup()})",
             "HTTP Range请求支持",
             "任务队列管理",
             "使用yt-dlp获取YouTube数据，无API配额限制",
@@ -1465,11 +2177,11 @@ def debug_files():
     }
     
     # 检查下载目录中的所有相关文件
-    safe_id = hashlib.md5(video_id.encode()).hexdigest()[:12]
-    for file_path in DOWNLOAD_DIR.glob(f"{safe_id}_{video_id}*"):
-        if file_path.is_file():
+    for entry in scan_video_files(video_id).values():
+        if entry.is_file():
+            file_path = Path(entry.path)
             try:
-                stat = file_path.stat()
+                stat = entry.stat()
                 mime_type = get_file_mime_type(file_path)
                 
                 file_info = {
@@ -1491,8 +2203,9 @@ def debug_files():
                 })
     
     # 检查任务信息
-    if video_id in tasks:
-        task = tasks[video_id]
+    task = tasks.get(video_id)
+    if task is not None:
+        task = task.snapshot()
         debug_info["task"] = {
             "status": task.status.value,
             "audio_file": task.audio_file,
@@ -1503,147 +2216,211 @@ def debug_files():
     
     return jsonify(debug_info)
 
+def rename_file_exclusive(src: str, dst: str):
+    """重命名文件但不覆盖已有文件
+    
+    先用硬链接占用目标文件名（目标已存在时抛出 FileExistsError，源不存在时抛出 FileNotFoundError），
+    再删除源文件；文件系统不支持硬链接或跨设备时退回普通重命名。
+    """
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP):
+            raise
+        if not os.path.isfile(src):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), src)
+        if os.path.exists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        os.replace(src, dst)
+    else:
+        os.unlink(src)
+
+# 修复操作记录：只在生成响应时展开为 {"action": ..., <details>, "success": ...}
+FixAction = namedtuple('FixAction', 'action success details')
+
+# 修复操作名称：模块级驻留字符串，所有响应共享同一对象
+FIX_RENAMED = sys.intern("renamed")
+FIX_RENAME_FAILED = sys.intern("rename_failed")
+FIX_TARGET_EXISTS = sys.intern("target_exists")
+FIX_NOT_FOUND = sys.intern("not_found")
+FIX_UPDATED_TASK = sys.intern("updated_task")
+
+def fix_action_dict(record: FixAction) -> Dict[str, Any]:
+    """将修复操作记录转换为响应中的字典"""
+    return {"action": record.action, **record.details, "success": record.success}
+
 @app.route('/fix/files')
 def fix_files():
     """修复端点：为无扩展名的音频文件添加扩展名"""
     video_id = request.args.get('id')
     if not video_id:
-        return jsonify({"error": "Missing video id"}), 400
+        return json_response({"error": "Missing video id"}, 400)
     
-    result = {
-        "video_id": video_id,
-        "actions": []
-    }
+    # 查找无扩展名的音频文件：路径和文件名只转换一次，后续直接复用字符串
+    target_s = os.fspath(get_file_path(video_id, "audio"))
+    base_s = target_s[:-len('.mp3')]
+    target_name = os.path.basename(target_s)
+    base_name = target_name[:-len('.mp3')]
     
-    # 查找无扩展名的音频文件
-    safe_id = hashlib.md5(video_id.encode()).hexdigest()[:12]
-    base_path = DOWNLOAD_DIR / f"{safe_id}_{video_id}"
-    
-    if base_path.exists() and base_path.is_file():
-        # 找到无扩展名文件
-        target_path = base_path.with_suffix('.mp3')
+    # 每个分支的操作数量固定，直接用列表字面量构造
+    try:
+        rename_file_exclusive(base_s, target_s)
+    except FileExistsError:
+        actions = [FixAction(FIX_TARGET_EXISTS, False, {"message": f"{target_name} already exists"})]
+    except FileNotFoundError:
+        actions = [FixAction(FIX_NOT_FOUND, False, {"message": f"No file found: {base_name}"})]
+    except Exception as e:
+        actions = [FixAction(FIX_RENAME_FAILED, False, {"error": str(e)})]
+    else:
+        renamed = FixAction(FIX_RENAMED, True, {"from": base_name, "to": target_name})
         
-        if not target_path.exists():
-            try:
-                shutil.move(str(base_path), str(target_path))
-                result["actions"].append({
-                    "action": "renamed",
-                    "from": base_path.name,
-                    "to": target_path.name,
-                    "success": True
-                })
-                
-                # 更新任务记录
-                if video_id in tasks:
-                    tasks[video_id].audio_file = str(target_path)
-                    result["actions"].append({
-                        "action": "updated_task",
-                        "audio_file": str(target_path),
-                        "success": True
-                    })
-                
-            except Exception as e:
-                result["actions"].append({
-                    "action": "rename_failed",
-                    "error": str(e),
-                    "success": False
-                })
+        # 更新任务记录
+        task = tasks.get(video_id)
+        if task is not None:
+            task.update(audio_file=os.path.realpath(target_s))
+            actions = [renamed, FixAction(FIX_UPDATED_TASK, True, {"audio_file": target_s})]
         else:
-            result["actions"].append({
-                "action": "target_exists",
-                "message": f"{target_path.name} already exists",
-                "success": False
-            })
-    else:
-        result["actions"].append({
-            "action": "not_found",
-            "message": f"No file found: {base_path.name}",
-            "success": False
-        })
+            actions = [renamed]
     
-    return jsonify(result)
+    return json_response({
+        "video_id": video_id,
+        "actions": [fix_action_dict(record) for record in actions]
+    })
 
 @app.route('/admin/cleanup', methods=['POST'])
 def manual_cleanup():
-    """手动触发清理（管理端点）"""
+    """手动触发清理（管理端点），?force=1 时忽略磁盘水位删除全部过期文件"""
     try:
-        logger.info("🧹 手动触发清理操作...")
-        
-        # 执行清理
-        old_task_count = len(tasks)
-        cleanup_old_files()
-        new_task_count = len(tasks)
+        force = request.args.get('force') == '1'
+        logger.info("🧹 手动触发清理操作... (force=%s)", force)
         
-        cleaned_tasks = old_task_count - new_task_count
+        # 提交到清理线程执行，不占用请求线程
+        queued = request_cleanup(force=force)
         
         # 统计当前状态
-        active_tasks = sum(1 for task in tasks.values() 
-                          if task.status in [TaskStatus.PENDING, TaskStatus.DOWNLOADING])
-        completed_tasks = sum(1 for task in tasks.values() 
-                             if task.status == TaskStatus.COMPLETED)
-        
-        return jsonify({
-            "status": "success",
-            "message": "手动清理完成",
+        counts = tasks.status_counts()
+        active_tasks = sum(counts[status] for status in ACTIVE_STATUSES)
+        completed_tasks = counts[TaskStatus.COMPLETED]
+        
+        return json_response({
+            "status": "accepted",
+            "message": "清理已触发，将在后台执行" if queued else "已有清理在排队，本次请求已合并到该次清理",
+            "force": force,
+            "coalesced": not queued,
             "cleanup_results": {
-                "tasks_cleaned": cleaned_tasks,
-                "remaining_tasks": new_task_count,
+                "remaining_tasks": len(tasks),
                 "active_tasks": active_tasks,
                 "completed_tasks": completed_tasks
             }
-        })
+        }, 202)
         
     except Exception as e:
-        logger.error(f"❌ 手动清理失败: {e}")
-        return jsonify({
+        logger.error("❌ 手动清理失败: %s", e)
+        return json_response({
             "status": "error",
             "message": f"清理失败: {str(e)}"
-        }), 500
+        }, 500)
 
-def cleanup_timer():
-    """定期清理定时器"""
-    while True:
-        time.sleep(3600)  # 每小时清理一次
-        cleanup_old_files()
+CLEANUP_INTERVAL = 3600  # 定期清理间隔（秒）
+# 清理专用的单线程池：不与元数据请求（ATP）争抢线程，也不会排在它们后面
+CLEANUP_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cleanup")
+_cleanup_stop = threading.Event()
+# 排队中的清理请求：同一时间最多排队一次清理，期间的请求合并到这一次（force 取或）
+_cleanup_state_lock = threading.Lock()
+_cleanup_queued = False
+_cleanup_force_pending = False
+
+def run_cleanup():
+    """执行一次排队的清理，开始前取走合并的 force 标志"""
+    global _cleanup_queued, _cleanup_force_pending
+    with _cleanup_state_lock:
+        _cleanup_queued = False
+        force = _cleanup_force_pending
+        _cleanup_force_pending = False
+    if _cleanup_stop.is_set():
+        return
+    cleanup_old_files(force=force)
+
+def request_cleanup(force: bool = False) -> bool:
+    """请求在清理线程中执行一次清理（不等待下一个定期周期），force=True 时忽略磁盘水位
+    
+    正在运行的清理结束后会再执行一次；已有清理在排队时合并到那一次（force 同样生效）。
+    返回 False 表示请求已合并到排队中的清理
+    """
+    global _cleanup_queued, _cleanup_force_pending
+    with _cleanup_state_lock:
+        _cleanup_force_pending = _cleanup_force_pending or force
+        if _cleanup_queued:
+            return False
+        _cleanup_queued = True
+    CLEANUP_POOL.submit(run_cleanup)
+    return True
+
+def stop_cleanup_timer():
+    """进程退出时停止后续清理"""
+    _cleanup_stop.set()
+
+atexit.register(stop_cleanup_timer)
+
+_background_jobs_started = False
+_background_jobs_lock = threading.Lock()
+
+def start_background_jobs():
+    """注册定期后台任务（文件清理），可重复调用；使用 WSGI 服务器运行时由其启动钩子调用"""
+    global _background_jobs_started
+    with _background_jobs_lock:
+        if _background_jobs_started:
+            return
+        _background_jobs_started = True
+    
+    # 定期任务共用 scheduler 线程计时，实际清理提交到清理线程执行，不阻塞其他到期回调
+    scheduler.call_every(CLEANUP_INTERVAL, request_cleanup)
+    logger.info("🧹 Cleanup timer started")
+
+# 启动信息：整体作为一条日志输出
+STARTUP_BANNER = """🚀 Starting YouTube Audio Download Server with yt-dlp Data API...
+📁 Download directory: {download_dir}
+📦 Cache directory: {cache_dir}
+⏰ Cache expiry: {cache_hours} hours
+💡 ffmpeg is optional - service works without it (may have format limitations)
+🔗 API endpoints:
+   # 下载相关
+   POST /download?id=VIDEO_ID   - Start download task
+   GET /status?id=VIDEO_ID      - Get download status
+   GET /files/audio?id=VIDEO_ID - Serve audio file
+   GET /files/subtitle?id=VIDEO_ID - Serve subtitle file
+   GET /info?id=VIDEO_ID        - Get video metadata
+   DELETE /cancel?id=VIDEO_ID   - Cancel download task
+   # YouTube数据获取（替代YouTube Data API v3）
+   GET /api/channel/info?id=CHANNEL_ID_OR_USERNAME - Get channel info
+   GET /api/channel/videos?id=CHANNEL_ID&limit=20  - Get channel videos
+   GET /api/video/info?id=VIDEO_ID                 - Get video info
+   GET /api/search/channel?q=QUERY&limit=10        - Search channels
+   # 工具
+   GET /health                  - Health check
+   GET /debug/files?id=VIDEO_ID - Debug file information"""
 
 if __name__ == '__main__':
-    logger.info("🚀 Starting YouTube Audio Download Server with yt-dlp Data API...")
-    logger.info("📁 Download directory: " + str(DOWNLOAD_DIR.absolute()))
-    logger.info("📦 Cache directory: " + str(CACHE_DIR.absolute()))
-    logger.info("⏰ Cache expiry: " + str(CACHE_EXPIRE_HOURS) + " hours")
-    logger.info("💡 ffmpeg is optional - service works without it (may have format limitations)")
-    logger.info("🔗 API endpoints:")
-    logger.info("   # 下载相关")
-    logger.info("   POST /download?id=VIDEO_ID   - Start download task")
-    logger.info("   GET /status?id=VIDEO_ID      - Get download status")
-    logger.info("   GET /files/audio?id=VIDEO_ID - Serve audio file")
-    logger.info("   GET /files/subtitle?id=VIDEO_ID - Serve subtitle file")
-    logger.info("   GET /info?id=VIDEO_ID        - Get video metadata")
-    logger.info("   DELETE /cancel?id=VIDEO_ID   - Cancel download task")
-    logger.info("   # YouTube数据获取（替代YouTube Data API v3）")
-    logger.info("   GET /api/channel/info?id=CHANNEL_ID_OR_USERNAME - Get channel info")
-    logger.info("   GET /api/channel/videos?id=CHANNEL_ID&limit=20  - Get channel videos")
-    logger.info("   GET /api/video/info?id=VIDEO_ID                 - Get video info")
-    logger.info("   GET /api/search/channel?q=QUERY&limit=10        - Search channels")
-    logger.info("   # 工具")
-    logger.info("   GET /health                  - Health check")
-    logger.info("   GET /debug/files?id=VIDEO_ID - Debug file information")
-    
-    # 检查依赖
-    try:
-        import yt_dlp
-        import flask
-        logger.info("✅ All dependencies are available")
-        logger.info(f"📦 yt-dlp version: {yt_dlp.version.__version__}")
-    except ImportError as e:
-        logger.error(f"❌ Missing dependency: {e}")
-        logger.error("💡 Please install: pip install flask yt-dlp")
-        sys.exit(1)
+    logger.info("\n%s", STARTUP_BANNER.format(
+        download_dir=DOWNLOAD_DIR.absolute(),
+        cache_dir=CACHE_DIR.absolute(),
+        cache_hours=CACHE_EXPIRE_HOURS,
+    ))
+    logger.info("📦 yt-dlp version: %s", YTDLP_VERSION)
     
     # 启动清理定时器
-    cleanup_thread = threading.Thread(target=cleanup_timer, daemon=True)
-    cleanup_thread.start()
-    logger.info("🧹 Cleanup timer started")
+    start_background_jobs()
+    
+    # 启动服务器：WAITRESS=1 时使用 waitress 的固定大小线程池，否则使用 Flask 内置服务器
+    if os.environ.get('WAITRESS') == '1':
+        try:
+            from waitress import serve
+        except ImportError:
+            logger.warning("⚠️ WAITRESS=1 but waitress is not installed (pip install waitress), falling back to Flask server")
+        else:
+            threads = int(os.environ.get('THREADS', 16))
+            logger.info(f"🍽️ Serving with waitress ({threads} threads)")
+            serve(app, host='0.0.0.0', port=5000, threads=threads)
+            sys.exit(0)
     
-    # 启动服务器
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file